@@ -1,15 +1,16 @@
 import streamlit as st
 import cv2
 import numpy as np
-import base64
-from openai import OpenAI
-import tempfile
 import os
-from PIL import Image
-import io
+import time
 import json
-# 确保安装的是 moviepy==1.0.3
-from moviepy.editor import VideoFileClip
+import threading
+from video_analysis import (
+    Settings, configure, get_result_cache, get_upload_store, get_image_base64, get_frame_at_time,
+    compute_scene_timeline, scene_distance_curve, select_scene_cuts, keyframes_from_timeline, stream_scene_keyframes,
+    analyze_image_reverse_engineering, analyze_ocr_text, iter_keyframe_analyses, iter_streamed_analyses, ocr_video_timeline,
+    cached_transcript_segments, ShotIndex, Trace, span,
+)
 
 # --- 1. 配置与密钥加载 ---
 st.set_page_config(
@@ -20,13 +21,8 @@ st.set_page_config(
 )
 
 try:
-    VISION_API_KEY = st.secrets["vision"]["api_key"]
-    VISION_BASE_URL = st.secrets["vision"]["base_url"]
-    VISION_MODEL = st.secrets["vision"]["model"]
-    
-    AUDIO_API_KEY = st.secrets["audio"]["api_key"]
-    AUDIO_BASE_URL = st.secrets["audio"]["base_url"]
-    AUDIO_MODEL = st.secrets["audio"]["model"]
+    # 密钥与可选的 [perf] 性能参数一并交给处理流水线，未配置的参数使用默认值
+    configure(Settings.from_mapping(st.secrets))
 except Exception as e:
     st.error(f"⚠️ 配置缺失: {e}。请检查 secrets.toml")
     st.stop()
@@ -116,176 +112,64 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 3. 核心逻辑函数 ---
+# 处理流水线在 video_analysis 包中（命令行批处理共用），这里只保留依赖 Streamlit 的部分
 
-def get_image_base64(image_array):
-    img = Image.fromarray(cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB))
-    buffer = io.BytesIO()
-    img.save(buffer, format="JPEG")
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+RESULT_CACHE = get_result_cache()
+UPLOAD_STORE = get_upload_store()
 
-# 新增：用于下载图片的转换函数
-def convert_frame_to_bytes(frame_array):
-    # OpenCV BGR -> RGB -> Bytes
-    img = Image.fromarray(cv2.cvtColor(frame_array, cv2.COLOR_BGR2RGB))
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    return buf.getvalue()
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_scene_timeline(file_hash, _video_path, _timeline=None):
+    # 以文件内容哈希为键缓存第一段结果，拖动灵敏度滑块时不再重新解码；
+    # 边检测边分析扫描完整个视频后，把得到的时间线传进来直接放入缓存
+    return _timeline if _timeline is not None else compute_scene_timeline(_video_path)
 
-def get_frame_at_time(video_path, time_sec=1.5):
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps == 0: fps = 30.0
-    frame_id = int(fps * time_sec)
-    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
-    ret, frame = cap.read()
-    cap.release()
-    return frame if ret else None
-
-def detect_scenes_ignore_subtitles(video_path, threshold=30.0):
-    cap = cv2.VideoCapture(video_path)
-    frames = []
-    timestamps = []
-    prev_hist = None
-    frame_count = 0
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps == 0: fps = 30.0 
-    while True:
-        ret, frame = cap.read()
-        if not ret: break
-        if frame_count % 15 == 0: 
-            height, width, _ = frame.shape
-            crop_h = int(height * 0.8) 
-            cropped_frame = frame[0:crop_h, :] 
-            hsv = cv2.cvtColor(cropped_frame, cv2.COLOR_BGR2HSV)
-            hist = cv2.calcHist([hsv], [0, 1], None, [180, 256], [0, 180, 0, 256])
-            cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
-            if prev_hist is None:
-                frames.append(frame)
-                timestamps.append(frame_count / fps)
-                prev_hist = hist
-            else:
-                score = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
-                if (1 - score) > (threshold / 100.0) and (frame_count / fps - timestamps[-1] > 1.5):
-                    frames.append(frame)
-                    timestamps.append(frame_count / fps)
-                    prev_hist = hist
-        frame_count += 1
-    cap.release()
-    return frames, timestamps
+@st.cache_resource
+def timeline_registry():
+    # 已经算过时间线的文件哈希，进程级、跨会话共享；时间线被缓存淘汰时 cached_scene_timeline 会重新计算
+    return set()
 
-def analyze_image_reverse_engineering(image_base64):
-    """
-    图生文反推模式：升级版 System Prompt，追求 95% 还原度
-    """
-    client = OpenAI(api_key=VISION_API_KEY, base_url=VISION_BASE_URL)
-    
-    # === 核心修改：赋予 AI 专家人设，要求极度精准的关键词 ===
-    system_prompt = """
-    你是一位顶级的 AI 绘画提示词工程师（Prompt Engineer），精通 Midjourney、Stable Diffusion 和 Flux 的提示词逻辑。
-    请深度剖析这张图片，反推出能完美还原该画面的提示词。
-    
-    请严格按照以下 JSON 格式输出（不要 Markdown）：
-    {
-        "style": "这里列出核心艺术风格。例如：Cyberpunk, Ukiyo-e, Oil Painting, 3D Render (Octane), Pixar Style, Matte Painting...",
-        "shot": "这里列出镜头与光影。例如：Wide angle, Telephoto lens, Dutch angle, Volumetric lighting, Rim light, Bokeh...",
-        "prompt": "这里编写一段高质量的英文 Prompt。必须包含：
-                   1. 主体细节（五官、衣着材质、表情）。
-                   2. 环境细节（背景元素、天气）。
-                   3. 技术参数（如：8k, photorealistic, masterpiece, highly detailed, unreal engine 5）。
-                   请使用逗号分隔的关键词形式。"
+def scene_curve_chart_spec(timeline, cuts, threshold):
+    times = timeline["frame_ids"] / timeline["fps"]
+    curve = [{"t": float(t), "d": float(d)} for t, d in zip(times[1:], scene_distance_curve(timeline))]
+    x = {"field": "t", "type": "quantitative", "title": "时间 (s)"}
+    return {
+        "height": 160,
+        "layer": [
+            {"data": {"values": curve}, "mark": {"type": "line", "color": "#448AFF"},
+             "encoding": {"x": x, "y": {"field": "d", "type": "quantitative", "title": "相邻采样差异"}}},
+            {"data": {"values": [{"y": threshold / 100.0}]}, "mark": {"type": "rule", "color": "#FF4081", "strokeDash": [4, 4]},
+             "encoding": {"y": {"field": "y", "type": "quantitative"}}},
+            {"data": {"values": [{"t": float(times[j])} for j in cuts]}, "mark": {"type": "rule", "color": "#FFD740", "opacity": 0.6},
+             "encoding": {"x": x}},
+        ],
     }
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model=VISION_MODEL,
-            messages=[
-                {"role": "user", "content": [
-                    {"type": "text", "text": system_prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
-                ]}
-            ],
-            max_tokens=800,
-        )
-        content = response.choices[0].message.content.replace("```json", "").replace("```", "").strip()
-        return json.loads(content)
-    except Exception as e:
-        return {"style": "Error", "shot": "Error", "prompt": str(e)}
 
-def analyze_video_frame_reconstruction(image_base64):
+def spool_upload(uploaded):
     """
-    针对 90% 还原度的画面帧反推 Prompt (升级版：增强风格与身份识别)
+    把 st.file_uploader 的文件落盘，返回 (路径, 内容哈希)。
+    同一会话里同一个上传在重跑时直接复用，既不重读也不重写
     """
-    client = OpenAI(api_key=VISION_API_KEY, base_url=VISION_BASE_URL)
-    
-    # === 这里是核心修改：大幅增强了提示词的要求 ===
-    system_prompt = """
-    你是一个顶级的 AI 艺术导演和提示词专家。
-    请深度分析这张视频截图，目标是生成一段能让 Midjourney/Sora 完美还原画面神韵的英文 Prompt。
-    
-    请特别注意以下细节的提取：
-    1. **人物身份与特征**：不要只说 "Person"。请仔细观察衣着（如长袍、斗笠、破旧衣物），判断是否为 Monk (僧人), Daoist (道士), Wanderer (流浪者) 或 Elder (老者)。
-    2. **摄影与艺术风格**：这是写实照片、CG渲染还是黑白电影？如果是黑白的，请加上 "Black and white photography, vintage style, film grain" 等关键词。
-    3. **环境与氛围**：描述天气（阴沉、迷雾）、光影（柔光、逆光）及画面的情绪（孤独、史诗感）。
-    
-    请严格按照 JSON 格式输出：
-    {
-        "cn_desc": "中文深度画面描述（必须明确写出人物身份，如：背负行囊的苦行僧/老道士，以及画面的黑白复古质感）",
-        "en_prompt": "High-fidelity English text-to-image prompt. Include keywords for: Subject Identity (e.g., old monk, ascetic), Clothing (traditional robes), Art Style (e.g., 1920s vintage photography, black and white, grainy film), Lighting, and Atmosphere."
-    }
-    不要输出 Markdown 标记。
-    """
-    
-    try:
-        response = client.chat.completions.create(
-            model=VISION_MODEL,
-            messages=[
-                {"role": "user", "content": [
-                    {"type": "text", "text": system_prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
-                ]}
-            ],
-            max_tokens=800, # 稍微增加了 token 限制以允许更详细的描述
-        )
-        content = response.choices[0].message.content.replace("```json", "").replace("```", "").strip()
-        return json.loads(content)
-    except Exception as e:
-        return {"cn_desc": "解析失败", "en_prompt": str(e)}
+    memo = st.session_state.setdefault("spooled_uploads", {})
+    upload_key = getattr(uploaded, "file_id", None) or f"{uploaded.name}:{uploaded.size}"
+    hit = memo.get(upload_key)
+    if hit and os.path.exists(hit[0]):
+        os.utime(hit[0])
+        return hit
+    memo[upload_key] = UPLOAD_STORE.spool(uploaded)
+    return memo[upload_key]
 
-def analyze_ocr_text(image_base64):
-    client = OpenAI(api_key=VISION_API_KEY, base_url=VISION_BASE_URL)
-    system_prompt = "你是一个专业的 OCR 文字识别助手。请识别画面中出现的所有【固定中文文字】，忽略底部的即时字幕。直接输出内容。"
-    try:
-        response = client.chat.completions.create(
-            model=VISION_MODEL,
-            messages=[
-                {"role": "user", "content": [{"type": "text", "text": system_prompt}, {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}]}
-            ], max_tokens=500,
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"OCR Error: {str(e)}"
+def render_trace(trace, key):
+    # 折叠显示本次运行各阶段的耗时与请求开销，可导出 JSON；配置了 metrics_log 时同时写入日志
+    trace.finish()
+    with st.expander(f"⏱️ 耗时明细（共 {trace.elapsed:.2f}s）"):
+        st.dataframe(trace.summary(), use_container_width=True, hide_index=True)
+        st.download_button("📥 导出 JSON", data=json.dumps(trace.to_dict(), ensure_ascii=False, indent=2),
+                           file_name=f"trace_{trace.name}_{trace.run_id}.json", mime="application/json",
+                           key=f"trace_{key}")
 
-def transcribe_audio_api(video_path):
-    try:
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_audio:
-            audio_path = temp_audio.name
-        video = VideoFileClip(video_path)
-        video.audio.write_audiofile(audio_path, codec='mp3', logger=None, ffmpeg_params=["-ac", "1"])
-        video.close()
-        client = OpenAI(api_key=AUDIO_API_KEY, base_url=AUDIO_BASE_URL)
-        with open(audio_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(model=AUDIO_MODEL, file=audio_file, response_format="text")
-        os.remove(audio_path)
-        if isinstance(transcript, str):
-            try:
-                data = json.loads(transcript)
-                if "text" in data: return data["text"]
-            except: pass
-            return transcript
-        return transcript.text
-    except Exception as e:
-        return f"Audio Error: {str(e)}"
+def format_timestamp(sec):
+    sec = int(sec)
+    return f"{sec // 3600:02d}:{sec % 3600 // 60:02d}:{sec % 60:02d}" if sec >= 3600 else f"{sec // 60:02d}:{sec % 60:02d}"
 
 # --- 4. 界面渲染 ---
 
@@ -306,12 +190,10 @@ with tab1:
 
     if uploaded_img:
         # 自动化处理：不需要按钮，直接开始
-        with st.spinner("AI 视觉引擎正在解析..."):
-            image = Image.open(uploaded_img)
-            buffered = io.BytesIO()
-            image.save(buffered, format="JPEG")
-            img_b64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-            result = analyze_image_reverse_engineering(img_b64)
+        trace = Trace("tab_image", file=uploaded_img.name)
+        with st.spinner("AI 视觉引擎正在解析..."), trace.activate():
+            image = cv2.imdecode(np.frombuffer(uploaded_img.getvalue(), np.uint8), cv2.IMREAD_UNCHANGED)
+            img_b64 = get_image_base64(image, source_bytes=uploaded_img.size)
             
             # 结果展示：左图右文布局 (1:2)
             st.write("")
@@ -319,7 +201,10 @@ with tab1:
             with r1:
                 st.image(uploaded_img, caption="原始图片", use_container_width=True)
             with r2:
-                st.markdown(f"""
+                # 流式请求：生成中的原始文本先逐段显示，收完解析出 JSON 后替换成结果卡片
+                live = st.empty()
+                result = analyze_image_reverse_engineering(img_b64, on_text=lambda text: live.code(text, language="json"))
+                live.markdown(f"""
                 <div class="info-card card-style">
                     <div class="card-header pink">🎨 风格提示词 (Style)</div>
                     <div class="card-content">{result.get('style', 'N/A')}</div>
@@ -333,6 +218,7 @@ with tab1:
                     <div class="card-content" style="user-select: all;">{result.get('prompt', 'N/A')}</div>
                 </div>
                 """, unsafe_allow_html=True)
+        render_trace(trace, "img")
 
 # === Tab 2: 视频拆解 (核心修改区) ===
 with tab2:
@@ -342,38 +228,78 @@ with tab2:
     t2_c1, t2_c2, t2_c3 = st.columns([1, 2, 1])
     with t2_c2:
         v_file = st.file_uploader(" ", type=["mp4", "mov"], key="v_up")
-        threshold = st.slider("切镜灵敏度", 10, 60, 25)
+        threshold = st.slider("切镜灵敏度", 10, 60, 25,
+                              help="数值越小切得越细。镜头差异按缩小到 320px 宽、30×32 分箱的色彩直方图计算，比旧版"
+                                   "（全分辨率、180×256 分箱）粗一些：同一数值下个别切点可能比旧版多一个或少一个")
 
     if v_file:
         # 自动化处理
-        tfile = tempfile.NamedTemporaryFile(delete=False)
-        tfile.write(v_file.read())
+        trace = Trace("tab_video", file=v_file.name, threshold=threshold)
+        with trace.activate():
+            video_path, file_hash = spool_upload(v_file)
         
-        with st.status("正在逐帧分析与生成提示词...", expanded=True) as status:
-            frames, tstamps = detect_scenes_ignore_subtitles(tfile.name, threshold)
-            st.write(f"检测到 {len(frames)} 个关键镜头，正在生成还原 Prompt...")
-            
+        with st.status("正在逐帧分析与生成提示词...", expanded=True) as status, trace.activate():
+            chart_slot = st.empty()
+            info_slot = st.empty()
             res_container = st.container()
-            for i, (frm, ts) in enumerate(zip(frames, tstamps)):
-                b64 = get_image_base64(frm)
-                res = analyze_video_frame_reconstruction(b64)
-                
+            # 并发（可分批）请求，结果仍按时间顺序逐个渲染；与本会话已分析镜头重复的画面直接复用结果
+            shot_index = st.session_state.setdefault("shot_index", ShotIndex())
+            scanned = timeline_registry()
+            streaming = file_hash not in scanned
+            if not streaming:
+                # 第一段（解码 + 直方图）按文件缓存；调整灵敏度只重跑第二段
+                timeline = cached_scene_timeline(file_hash, video_path)
+                cut_start = time.perf_counter()
+                cuts = select_scene_cuts(timeline, threshold)
+                cut_ms = (time.perf_counter() - cut_start) * 1000
+                keyframes = keyframes_from_timeline(video_path, timeline, cuts)
+                det_stats = timeline["stats"]
+                chart_slot.vega_lite_chart(spec=scene_curve_chart_spec(timeline, cuts, threshold), use_container_width=True)
+                info_slot.write(f"检测到 {len(keyframes)} 个关键镜头（解码 {det_stats['fps']:.0f} 帧/秒，耗时 {det_stats['seconds']:.1f}s；"
+                                f"阈值切分 {cut_ms:.1f}ms），正在生成还原 Prompt...")
+                analyses = iter_keyframe_analyses(keyframes, shot_index=shot_index, video_key=file_hash,
+                                                  source=v_file.name)
+            else:
+                # 首次处理该文件：边解码边分析，找到第一个镜头就开始请求，不等整段视频扫描完；
+                # 重跑打断本次运行时 cancel 被设置，解码在下一个采样点就停下
+                timeline = {}
+                cancel = threading.Event()
+                keyframes, stream = stream_scene_keyframes(video_path, threshold, timeline=timeline, cancel=cancel)
+                info_slot.write("正在边检测镜头边生成还原 Prompt...")
+                # 等 API 返回期间也刷新已检测的镜头数
+                show_progress = lambda detected: status.update(
+                    label=f"正在逐帧分析与生成提示词...（已检测 {detected} 个镜头，已完成 {done} 个）")
+                analyses = iter_streamed_analyses(keyframes, stream, shot_index=shot_index, video_key=file_hash,
+                                                  source=v_file.name, cancel=cancel, on_progress=show_progress)
+            repeat_count = 0
+            done = 0
+            for done, (i, res) in enumerate(analyses, 1):
+                if streaming: show_progress(len(keyframes))
+                ts = keyframes.timestamps[i]
                 with res_container:
                     # 结果布局：图片变大 (2:3 布局)
                     res_c1, res_c2 = st.columns([2, 3])
                     
                     with res_c1:
-                        st.image(frm, channels="BGR", use_container_width=True)
-                        # 下载按钮逻辑
-                        img_bytes = convert_frame_to_bytes(frm)
+                        thumb = keyframes.thumbnail(i)
+                        if thumb:
+                            st.image(thumb, use_container_width=True)
+                        else:
+                            st.caption("⚠️ 该帧无法回读（视频文件可能已被清理）")
+                        # 下载按钮逻辑：点击时才回读全分辨率帧并编码 PNG
                         st.download_button(
                             label="📥 下载该帧",
-                            data=img_bytes,
+                            data=lambda i=i: keyframes.png_bytes(i),
                             file_name=f"frame_{ts:.2f}.png",
                             mime="image/png",
                             key=f"dl_{ts}"
                         )
                         st.caption(f"⏱️ 时间点: {ts:.2f}s")
+                        repeat = res.get("repeat_of")
+                        if repeat:
+                            repeat_count += 1
+                            src = "本视频" if repeat["source"] == v_file.name else repeat["source"]
+                            st.caption(f"🔁 重复镜头：复用 {src} {repeat['time']:.2f}s 的分析")
                         
                     with res_c2:
                         st.markdown(f"""
@@ -387,7 +313,18 @@ with tab2:
                         </div>
                         """, unsafe_allow_html=True)
                     st.divider()
-            status.update(label="✅ 分析完成", state="complete", expanded=False)
+            if streaming and timeline:
+                # 流式扫描完整结束：时间线放入缓存，补上差异曲线，之后拖动滑块不再重新解码
+                cached_scene_timeline(file_hash, video_path, _timeline=timeline)
+                scanned.add(file_hash)
+                det_stats = timeline["stats"]
+                chart_slot.vega_lite_chart(spec=scene_curve_chart_spec(timeline, select_scene_cuts(timeline, threshold), threshold),
+                                           use_container_width=True)
+                info_slot.write(f"检测到 {len(keyframes)} 个关键镜头（解码 {det_stats['fps']:.0f} 帧/秒，耗时 {det_stats['seconds']:.1f}s，"
+                                f"与分析同时进行）")
+            status.update(label=f"✅ 分析完成（{repeat_count} 个重复镜头复用已有分析）" if repeat_count else "✅ 分析完成",
+                          state="complete", expanded=False)
+        render_trace(trace, "video")
 
 # === Tab 3: 口播扒取 ===
 with tab3:
@@ -399,10 +336,16 @@ with tab3:
     
     if a_file:
         # 自动化处理
-        tfile_a = tempfile.NamedTemporaryFile(delete=False)
-        tfile_a.write(a_file.read())
-        with st.spinner("AI 听写中..."):
-            txt = transcribe_audio_api(tfile_a.name)
+        trace = Trace("tab_audio", file=a_file.name)
+        with trace.activate():
+            audio_path, audio_hash = spool_upload(a_file)
+        with st.spinner("AI 听写中..."), trace.activate():
+            try:
+                segments = cached_transcript_segments(audio_path, audio_hash)
+                txt = "\n".join(seg["text"] for seg in segments if seg["text"])
+            except Exception as e:
+                segments = []
+                txt = f"Audio Error: {str(e)}"
             
             # 结果展示居中
             r3_c1, r3_c2, r3_c3 = st.columns([1, 6, 1])
@@ -414,6 +357,11 @@ with tab3:
                     <div class="card-content" style="user-select: all;">{txt}</div>
                 </div>
                 """, unsafe_allow_html=True)
+                if len(segments) > 1:
+                    with st.expander(f"⏱️ 分段时间轴（{len(segments)} 段）"):
+                        for seg in segments:
+                            st.markdown(f"**[{format_timestamp(seg['start'])} - {format_timestamp(seg['end'])}]** {seg['text']}")
+        render_trace(trace, "audio")
 
 # === Tab 4: 文字提取 ===
 with tab4:
@@ -422,26 +370,56 @@ with tab4:
     t4_c1, t4_c2, t4_c3 = st.columns([1, 2, 1])
     with t4_c2:
         ocr_file = st.file_uploader(" ", type=["mp4", "mov"], key="ocr_up")
+        ocr_full_scan = st.toggle("全片扫描（只对文字变化的画面调用识别）", value=False)
     
     if ocr_file:
         # 自动化处理
-        tfile_ocr = tempfile.NamedTemporaryFile(delete=False)
-        tfile_ocr.write(ocr_file.read())
-        frame = get_frame_at_time(tfile_ocr.name, time_sec=1.5)
+        trace = Trace("tab_ocr", file=ocr_file.name, full_scan=ocr_full_scan)
+        with trace.activate():
+            ocr_path, _ = spool_upload(ocr_file)
         
-        if frame is not None:
-            with st.spinner("OCR 识别中..."):
-                b64 = get_image_base64(frame)
-                ocr_text = analyze_ocr_text(b64)
-                
-                # 结果展示 (1:1 布局)
+        if ocr_full_scan:
+            with st.spinner("全片扫描文字变化并识别中..."), trace.activate():
+                ocr_entries, ocr_store, ocr_stats = ocr_video_timeline(ocr_path)
+            st.caption(f"采样 {ocr_stats['samples']} 帧（本地扫描 {ocr_stats['seconds']:.1f}s），"
+                       f"检测到 {ocr_stats['changes']} 次文字变化，调用 OCR {ocr_stats['api_calls']} 次，"
+                       f"合并为 {len(ocr_entries)} 段")
+            for entry in ocr_entries:
                 ocr_c1, ocr_c2 = st.columns([1, 1])
                 with ocr_c1:
-                    st.image(frame, channels="BGR", caption="识别帧", use_container_width=True)
+                    st.image(ocr_store.thumbnail(entry["index"]), use_container_width=True,
+                             caption=f"⏱️ {format_timestamp(entry['start'])} - {format_timestamp(entry['end'])}")
                 with ocr_c2:
                     st.markdown(f"""
                     <div class="info-card card-ocr">
                         <div class="card-header orange">🔠 提取结果 (OCR)</div>
-                        <div class="card-content" style="white-space: pre-line; user-select: all;">{ocr_text}</div>
+                        <div class="card-content" style="white-space: pre-line; user-select: all;">{entry['text']}</div>
                     </div>
                     """, unsafe_allow_html=True)
+        else:
+            with trace.activate(), span("frame.read", source="video"):
+                frame = get_frame_at_time(ocr_path, time_sec=1.5)
+            
+            if frame is not None:
+                with st.spinner("OCR 识别中..."), trace.activate():
+                    b64 = get_image_base64(frame)
+                    ocr_text = analyze_ocr_text(b64)
+                    
+                    # 结果展示 (1:1 布局)
+                    ocr_c1, ocr_c2 = st.columns([1, 1])
+                    with ocr_c1:
+                        st.image(frame, channels="BGR", caption="识别帧", use_container_width=True)
+                    with ocr_c2:
+                        st.markdown(f"""
+                        <div class="info-card card-ocr">
+                            <div class="card-header orange">🔠 提取结果 (OCR)</div>
+                            <div class="card-content" style="white-space: pre-line; user-select: all;">{ocr_text}</div>
+                        </div>
+                        """, unsafe_allow_html=True)
+        render_trace(trace, "ocr")
+
+# === 侧边栏：结果缓存统计 ===
+with st.sidebar:
+    cache_stats = RESULT_CACHE.stats()
+    st.caption(f"🗄️ 结果缓存：命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}，"
+               f"{cache_stats['entries']} 条，{cache_stats['bytes'] / 1024:.0f} KB")
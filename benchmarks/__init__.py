@@ -0,0 +1,4 @@
+"""
+性能基准：合成测试素材 + 本地 OpenAI 兼容桩服务器，输出可在两次运行之间对比的 JSON。
+用法见 benchmarks/run.py
+"""
@@ -0,0 +1,295 @@
+"""
+基准测试入口（在仓库根目录运行）：
+
+    python -m benchmarks.run -o bench.json                   # 完整矩阵
+    python -m benchmarks.run --quick -o bench.json           # 只跑最小的一组，用于快速回归
+    python -m benchmarks.run -o new.json --compare bench.json
+
+每个视频用例记录：切镜检测帧率（两段式单线程 / 分段多线程 / 旧接口）、切镜查准率与召回率、关键帧编码耗时与体积、
+视频拆解（两段式 / 边检测边分析）与全片 OCR 的端到端耗时、首个结果耗时、API 调用次数与新建连接数、各阶段峰值 RSS；另外记录图生文（流式，含首段文本耗时）与口播转写两个页签。
+API 请求全部发往本地桩服务器，每个用例使用全新的结果缓存目录（冷缓存）
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from video_analysis import (
+    Settings, ShotIndex, analyze_image_reverse_engineering, compute_scene_timeline, configure, detect_scenes_ignore_subtitles,
+    encode_image, get_image_base64, iter_keyframe_analyses, iter_streamed_analyses, keyframes_from_timeline,
+    ocr_video_timeline, select_scene_cuts, settings, stream_scene_keyframes, transcribe_audio_segments,
+)
+from video_analysis.scenes import SCENE_STRIDE, plan_segments
+
+from .stub_server import StubServer
+from .synth import cached_video, make_image, make_speech_wav
+
+FULL_MATRIX = [(640, 360, 30), (1280, 720, 30), (1920, 1080, 30), (1280, 720, 120)]
+QUICK_MATRIX = [(640, 360, 20)]
+
+
+class PeakRSS:
+    """
+    后台线程定时采样当前 RSS，记录区间内峰值（MB）；没有 /proc 的系统退回 ru_maxrss（进程级峰值）
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _current(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss if sys.platform == "darwin" else rss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._current())
+
+    def __enter__(self):
+        self.peak = self._current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._current())
+
+    @property
+    def mb(self):
+        return round(self.peak / 2 ** 20, 1)
+
+
+def measure(fn):
+    # 返回 (结果, 耗时秒, 峰值 RSS MB)
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+    return result, round(elapsed, 4), rss.mb
+
+
+def cut_accuracy(predicted, truth, tolerance):
+    """
+    切镜查准率 / 召回率：预测帧号与真实帧号相差不超过 tolerance 帧即算命中，一一匹配
+    """
+    predicted = sorted(p for p in predicted if p > 0)
+    unmatched = list(truth)
+    hits = 0
+    for p in predicted:
+        best = min(unmatched, key=lambda t: abs(t - p), default=None)
+        if best is not None and abs(best - p) <= tolerance:
+            unmatched.remove(best)
+            hits += 1
+    precision = hits / len(predicted) if predicted else 1.0
+    recall = hits / len(truth) if truth else 1.0
+    return round(precision, 4), round(recall, 4)
+
+
+def fresh_cache(work_dir, name):
+    # 每个用例独立的结果缓存目录，保证测到的是冷缓存下的真实请求
+    cache_dir = os.path.join(work_dir, "cache", name)
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    configure(dataclasses.replace(settings, cache_dir=cache_dir))
+
+
+def bench_video(work_dir, stub, width, height, duration, fps=25, threshold=25.0, legacy=True):
+    path, truth = cached_video(os.path.join(work_dir, "media"), width, height, fps, duration)
+    tolerance = SCENE_STRIDE + 1
+    case = {"name": f"video_{width}x{height}_{int(duration)}s", "width": width, "height": height,
+            "duration": duration, "true_cuts": len(truth)}
+
+    timeline, seconds, rss = measure(lambda: compute_scene_timeline(path, workers=1))
+    cuts = select_scene_cuts(timeline, threshold)
+    precision, recall = cut_accuracy([int(timeline["frame_ids"][j]) for j in cuts], truth, tolerance)
+    case["detect"] = {"fps": round(timeline["stats"]["frames"] / seconds, 1), "seconds": seconds, "peak_rss_mb": rss,
+                      "precision": precision, "recall": recall}
+    workers = os.cpu_count() or 1
+    if workers > 1:
+        parallel, seconds, rss = measure(lambda: compute_scene_timeline(path, workers=workers))
+        case["detect_parallel"] = {"fps": round(parallel["stats"]["frames"] / seconds, 1), "seconds": seconds,
+                                   "peak_rss_mb": rss, "workers": workers,
+                                   "segments": len(plan_segments(parallel["stats"]["frames"], SCENE_STRIDE, workers,
+                                                                 settings.scene_segment_min_frames)),
+                                   "matches_serial": select_scene_cuts(parallel, threshold) == cuts}
+    if legacy:
+        (frames, timestamps), seconds, rss = measure(lambda: detect_scenes_ignore_subtitles(path, threshold))
+        precision, recall = cut_accuracy([int(round(t * fps)) for t in timestamps], truth, tolerance)
+        case["detect_legacy"] = {"fps": round(timeline["stats"]["frames"] / seconds, 1), "seconds": seconds,
+                                 "peak_rss_mb": rss, "precision": precision, "recall": recall}
+        del frames
+
+    keyframes = keyframes_from_timeline(path, timeline, cuts)
+    sample = [keyframes.frame(i) for i in range(min(5, len(keyframes)))]
+    start = time.perf_counter()
+    sizes = [len(encode_image(frame)) for frame in sample]
+    case["encode"] = {"ms_per_frame": round((time.perf_counter() - start) * 1000 / max(1, len(sample)), 2),
+                      "kb_per_frame": round(sum(sizes) / max(1, len(sizes)) / 1024, 1)}
+
+    # 视频拆解页签：检测 + 关键帧并发分析（与界面相同，带会话级重复镜头索引）
+    fresh_cache(work_dir, case["name"] + "_tab2")
+    stub.reset_counts()
+    def first_result(analyses, start):
+        # 消费全部结果，返回 (结果数, 从 start 起到首个结果的耗时)
+        first = None
+        count = 0
+        for _ in analyses:
+            if first is None: first = time.perf_counter() - start
+            count += 1
+        return count, round(first or 0.0, 4)
+    def tab2():
+        start = time.perf_counter()
+        tl = compute_scene_timeline(path)
+        store = keyframes_from_timeline(path, tl, select_scene_cuts(tl, threshold))
+        return first_result(iter_keyframe_analyses(store, shot_index=ShotIndex()), start)
+    (count, first), seconds, rss = measure(tab2)
+    case["tab_video"] = {"seconds": seconds, "first_result_seconds": first, "peak_rss_mb": rss, "keyframes": count,
+                         **stub.counts}
+
+    # 视频拆解页签首次处理（边检测边分析）
+    fresh_cache(work_dir, case["name"] + "_tab2_stream")
+    stub.reset_counts()
+    def tab2_stream():
+        start = time.perf_counter()
+        store, stream = stream_scene_keyframes(path, threshold)
+        return first_result(iter_streamed_analyses(store, stream, shot_index=ShotIndex()), start)
+    (count, first), seconds, rss = measure(tab2_stream)
+    case["tab_video_stream"] = {"seconds": seconds, "first_result_seconds": first, "peak_rss_mb": rss,
+                                "keyframes": count, **stub.counts}
+
+    # 文字提取页签（全片扫描）
+    fresh_cache(work_dir, case["name"] + "_tab4")
+    stub.reset_counts()
+    (entries, _, stats), seconds, rss = measure(lambda: ocr_video_timeline(path))
+    case["tab_ocr"] = {"seconds": seconds, "peak_rss_mb": rss, "changes": stats["changes"], "entries": len(entries),
+                       **stub.counts}
+    return case
+
+
+def bench_image(work_dir, stub):
+    path = os.path.join(work_dir, "media", "image_2048x1536.png")
+    if not os.path.exists(path): make_image(path)
+    fresh_cache(work_dir, "tab_image")
+    stub.reset_counts()
+    first = []
+    def tab1():
+        # 与界面相同的流式请求，记录首段文本到达的时间
+        start = time.perf_counter()
+        image = cv2.imdecode(np.fromfile(path, np.uint8), cv2.IMREAD_UNCHANGED)
+        on_text = lambda text: first or first.append(round(time.perf_counter() - start, 4))
+        return analyze_image_reverse_engineering(get_image_base64(image, source_bytes=os.path.getsize(path)), on_text)
+    _, seconds, rss = measure(tab1)
+    return {"name": "tab_image", "seconds": seconds, "first_text_seconds": first[0] if first else None,
+            "peak_rss_mb": rss, **stub.counts}
+
+
+def bench_audio(work_dir, stub, duration):
+    path = os.path.join(work_dir, "media", f"speech_{int(duration)}s.wav")
+    if not os.path.exists(path): make_speech_wav(path, duration)
+    fresh_cache(work_dir, "tab_audio")
+    stub.reset_counts()
+    segments, seconds, rss = measure(lambda: transcribe_audio_segments(path))
+    return {"name": f"tab_audio_{int(duration)}s", "seconds": seconds, "peak_rss_mb": rss, "segments": len(segments),
+            **stub.counts}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"commit": commit, "python": platform.python_version(), "opencv": cv2.__version__,
+            "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def flatten(report):
+    # {"用例.阶段.指标": 数值}，用于两次运行之间对比
+    flat = {}
+    for case in report["cases"]:
+        for key, value in case.items():
+            if isinstance(value, dict):
+                for metric, v in value.items():
+                    if isinstance(v, (int, float)): flat[f"{case['name']}.{key}.{metric}"] = v
+            elif isinstance(value, (int, float)) and key not in ("width", "height", "duration"):
+                flat[f"{case['name']}.{key}"] = value
+    return flat
+
+
+def compare(old, new):
+    old_flat, new_flat = flatten(old), flatten(new)
+    lines = []
+    for key in sorted(new_flat):
+        if key not in old_flat: continue
+        a, b = old_flat[key], new_flat[key]
+        change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+        lines.append(f"{key:55s} {a:>12g} -> {b:<12g} {change}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="视频分析性能基准")
+    parser.add_argument("-o", "--output", help="结果 JSON 路径（默认输出到标准输出）")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    parser.add_argument("--quick", action="store_true", help="只跑最小的一组用例")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "video-analysis-bench"),
+                        help="合成素材与缓存目录（素材按参数复用）")
+    parser.add_argument("--no-legacy", action="store_true", help="跳过旧检测接口 (detect_scenes_ignore_subtitles)")
+    parser.add_argument("--latency", type=float, default=0.3, help="桩服务器平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="桩服务器返回错误的概率")
+    parser.add_argument("--error-status", type=int, default=429)
+    args = parser.parse_args(argv)
+
+    stub = StubServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      error_status=args.error_status).start()
+    configure(Settings(vision_api_key="bench", vision_base_url=stub.base_url, vision_model="bench-vision",
+                       audio_api_key="bench", audio_base_url=stub.base_url, audio_model="bench-audio"))
+    cases = []
+    try:
+        for width, height, duration in QUICK_MATRIX if args.quick else FULL_MATRIX:
+            cases.append(bench_video(args.work_dir, stub, width, height, duration, legacy=not args.no_legacy))
+            print(f"{cases[-1]['name']}: 检测 {cases[-1]['detect']['fps']} fps", file=sys.stderr)
+        cases.append(bench_image(args.work_dir, stub))
+        cases.append(bench_audio(args.work_dir, stub, 30 if args.quick else 120))
+    finally:
+        stub.stop()
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "config": {"quick": args.quick, "latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+                   "error_status": args.error_status, "settings": dataclasses.asdict(settings)},
+        "cases": cases,
+    }
+    for key in ("vision_api_key", "audio_api_key", "cache_dir"):
+        report["config"]["settings"].pop(key)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(json.load(f), report), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+本地 OpenAI 兼容桩服务器：/v1/chat/completions（支持 stream=True）与 /v1/audio/transcriptions，
+可配置延迟、抖动和错误率（429 带 Retry-After / 500），用于在不联网的情况下测端到端耗时。
+latency 为首个 token 前的等待，流式响应之后每个分片再隔 chunk_interval 秒；counts["connections"] 统计新建的 TCP 连接数。
+
+单独运行：python -m benchmarks.stub_server --port 8765 --latency 0.5 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.3, jitter=0.1, error_rate=0.0, error_status=429,
+                 retry_after=0, audio_latency=None, chunk_interval=0.01, seed=0):
+        self.latency = latency
+        self.chunk_interval = chunk_interval
+        self.jitter = jitter
+        self.audio_latency = latency * 3 if audio_latency is None else audio_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"chat": 0, "audio": 0, "errors": 0, "images": 0, "connections": 0}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_counts(self):
+        with self.lock:
+            for key in self.counts: self.counts[key] = 0
+
+    def _draw(self, latency):
+        with self.lock:
+            delay = max(0.0, latency + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+            if fail: self.counts["errors"] += 1
+        return delay, fail
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with server.lock: server.counts["connections"] += 1
+
+            def _send(self, status, body, content_type="application/json", headers=()):
+                self.send_response(status)
+                self.send_header("content-type", content_type)
+                self.send_header("content-length", str(len(body)))
+                for key, value in headers: self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("content-length", 0)))
+                audio = self.path.endswith("/audio/transcriptions")
+                delay, fail = server._draw(server.audio_latency if audio else server.latency)
+                time.sleep(delay)
+                if fail:
+                    headers = [("retry-after", str(server.retry_after))] if server.error_status == 429 else []
+                    return self._send(server.error_status, b'{"error": {"message": "stub error"}}', headers=headers)
+                if audio:
+                    with server.lock: server.counts["audio"] += 1
+                    return self._send(200, "这是一段模拟的口播转写文本。".encode("utf-8"), "text/plain; charset=utf-8")
+                if not self.path.endswith("/chat/completions"):
+                    return self._send(404, b'{"error": {"message": "not found"}}')
+                request = json.loads(body)
+                parts = request["messages"][0]["content"]
+                images = sum(1 for p in parts if p.get("type") == "image_url")
+                with server.lock:
+                    server.counts["chat"] += 1
+                    server.counts["images"] += images
+                content = _chat_content(parts[0]["text"], images)
+                if not isinstance(content, str): content = json.dumps(content, ensure_ascii=False)
+                usage = {"prompt_tokens": len(body) // 4, "completion_tokens": len(content) // 2,
+                         "total_tokens": len(body) // 4 + len(content) // 2}
+                if request.get("stream"):
+                    include_usage = (request.get("stream_options") or {}).get("include_usage")
+                    try:
+                        return self._stream(request["model"], content, usage if include_usage else None)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # 客户端中途关闭了流（如界面重跑），不算服务端错误
+                        self.close_connection = True
+                        return
+                response = {
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": request["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": usage,
+                }
+                self._send(200, json.dumps(response, ensure_ascii=False).encode("utf-8"))
+
+            def _stream(self, model, content, usage=None):
+                # SSE + chunked 编码，连接保持可复用
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("transfer-encoding", "chunked")
+                self.end_headers()
+                pieces = [content[k:k + 8] for k in range(0, len(content), 8)]
+                for k, piece in enumerate(pieces):
+                    if k: time.sleep(server.chunk_interval)
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+                if usage is not None:
+                    # stream_options.include_usage：最后一个分片 choices 为空，只带 usage
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                             "choices": [], "usage": usage}
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, text):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def _chat_content(prompt, images):
+    # 按提示词给出各功能期望的返回格式
+    frame = {"cn_desc": "模拟的中文画面描述", "en_prompt": "simulated prompt, cinematic lighting, 8k"}
+    if images > 1: return [dict(frame, index=i) for i in range(images)]
+    if '"style"' in prompt: return {"style": "Matte Painting", "shot": "Wide angle", "prompt": "simulated prompt"}
+    if "OCR" in prompt: return "模拟识别文字"
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stub_server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    args = parser.parse_args(argv)
+    server = StubServer(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        error_status=args.error_status).start()
+    print(f"stub server: {server.base_url}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
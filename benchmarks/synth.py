@@ -0,0 +1,101 @@
+"""
+合成测试素材：已知切镜位置的视频（带底部烧录字幕与上方标题字）、带静音间隔的音频、测试图片
+"""
+import json
+import os
+import wave
+
+import cv2
+import numpy as np
+
+
+def _make_setup(rng, width, height):
+    # 一个镜头的画面：随机双色渐变背景 + 几个彩色圆形
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    c1, c2 = rng.integers(0, 255, 3).astype(np.float32), rng.integers(0, 255, 3).astype(np.float32)
+    angle = rng.uniform(0, 2 * np.pi)
+    t = ((np.cos(angle) * xx / width + np.sin(angle) * yy / height) % 1.0)[..., None]
+    base = (c1 * (1 - t) + c2 * t).astype(np.uint8)
+    shapes = [(int(rng.integers(0, width)), int(rng.integers(0, int(height * 0.8))),
+               int(rng.integers(height // 10, height // 3)), tuple(int(x) for x in rng.integers(0, 255, 3)))
+              for _ in range(4)]
+    return base, shapes
+
+
+def make_cut_video(path, width=640, height=360, fps=25, duration=30.0, min_shot=2.0, max_shot=4.0, seed=0):
+    """
+    生成测试视频并返回真实切镜帧号列表（不含第 0 帧）。
+    每个镜头内有轻微运动和噪声；底部 15% 为每秒变化的字幕条，检测器应忽略；
+    每个镜头上方有一行标题字，供全片 OCR 检测文字变化
+    """
+    rng = np.random.default_rng(seed)
+    total = int(round(fps * duration))
+    cuts = []
+    frame_id = 0
+    while True:
+        frame_id += int(round(fps * rng.uniform(min_shot, max_shot)))
+        if frame_id >= total: break
+        cuts.append(frame_id)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    scale = height / 400
+    bounds = [0] + cuts + [total]
+    for shot, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        base, shapes = _make_setup(rng, width, height)
+        for frame_id in range(start, end):
+            frame = base.copy()
+            k = frame_id - start
+            for (x, y, r, color) in shapes:
+                cv2.circle(frame, (x + k, y), r, color, -1)
+            cv2.putText(frame, f"SCENE {shot + 1}", (int(width * 0.05), int(height * 0.15)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.5 * scale, (255, 255, 255), max(1, int(3 * scale)))
+            noise = rng.integers(-6, 7, frame.shape, dtype=np.int16)
+            frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+            cv2.rectangle(frame, (0, int(height * 0.85)), (width, height), (0, 0, 0), -1)
+            cv2.putText(frame, f"subtitle {frame_id // int(fps)}: the quick brown fox", (int(width * 0.03), int(height * 0.95)),
+                        cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255), max(1, int(2 * scale)))
+            writer.write(frame)
+    writer.release()
+    return cuts
+
+
+def make_speech_wav(path, duration=120.0, sample_rate=16000, channels=2, seed=0):
+    # 模拟口播：2-8 秒的调制音 + 0.3-1 秒静音交替；双声道使转写走解码切片流程
+    rng = np.random.default_rng(seed)
+    parts = []
+    length = 0
+    while length < duration * sample_rate:
+        n = int(rng.uniform(2, 8) * sample_rate)
+        t = np.arange(n) / sample_rate
+        voice = np.sin(2 * np.pi * rng.uniform(150, 400) * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+        parts += [(voice * 8000).astype(np.int16), np.zeros(int(rng.uniform(0.3, 1.0) * sample_rate), np.int16)]
+        length += parts[-2].size + parts[-1].size
+    pcm = np.concatenate(parts)[:int(duration * sample_rate)]
+    with wave.open(path, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(np.repeat(pcm, channels).tobytes())
+
+
+def make_image(path, width=2048, height=1536, seed=0):
+    rng = np.random.default_rng(seed)
+    base, shapes = _make_setup(rng, width, height)
+    for (x, y, r, color) in shapes:
+        cv2.circle(base, (x, y), r, color, -1)
+    cv2.imwrite(path, base)
+
+
+def cached_video(work_dir, width, height, fps, duration, seed=0):
+    """
+    按参数缓存生成的视频与真实切镜位置（同目录 .json），返回 (路径, 切镜帧号)
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    path = os.path.join(work_dir, f"cuts_{width}x{height}_{fps}fps_{int(duration)}s_{seed}.mp4")
+    meta = path[:-4] + ".json"
+    if os.path.exists(path) and os.path.exists(meta):
+        with open(meta) as f:
+            return path, json.load(f)["cuts"]
+    cuts = make_cut_video(path, width, height, fps, duration, seed=seed)
+    with open(meta, "w") as f:
+        json.dump({"cuts": cuts, "fps": fps}, f)
+    return path, cuts
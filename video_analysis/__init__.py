@@ -0,0 +1,19 @@
+"""
+视听语言分析工作站的处理流水线：切镜检测、画面反推、全片 OCR 与口播转写。
+Streamlit 界面 (app.py) 与命令行 (python -m video_analysis) 共用这里的实现
+"""
+from .config import Settings, configure, settings
+from .tracing import Trace, span
+from .cache import ResultCache, file_sha256, get_result_cache
+from .encoding import convert_frame_to_bytes, encode_image, get_image_base64
+from .frames import KeyframeStore, get_frame_at_index, get_frame_at_time
+from .scenes import (compute_scene_hist, compute_scene_timeline, detect_scenes_fast, detect_scenes_ignore_subtitles,
+                     keyframes_from_timeline, scene_distance_curve, select_scene_cuts, stream_scene_keyframes)
+from .api import (TokenBucket, call_api_with_retry, get_audio_client, get_vision_bucket, get_vision_client,
+                  map_concurrent_ordered)
+from .dedup import ShotIndex, frame_phash
+from .uploads import UploadStore, get_upload_store
+from .vision import (analyze_image_reverse_engineering, analyze_ocr_text, analyze_video_frame_reconstruction,
+                     analyze_video_frames_batch, iter_keyframe_analyses, iter_streamed_analyses)
+from .ocr import ocr_video_timeline
+from .audio import cached_transcript_segments, transcribe_audio_api, transcribe_audio_segments
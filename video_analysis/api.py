@@ -0,0 +1,220 @@
+"""
+模型 API 调用：共享客户端（连接池）、限速、重试、结果缓存、流式输出与并发调度
+"""
+import functools
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from openai import DefaultHttpxClient, OpenAI, APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+from openai.types.chat import ChatCompletion
+
+try:
+    import httpx2 as httpx  # 新版 openai SDK 基于 httpx2
+except ImportError:
+    import httpx
+
+from .cache import ResultCache, get_result_cache
+from .config import settings
+from .encoding import image_mime
+from .tracing import add_span, bind, span
+
+logger = logging.getLogger("video_analysis")
+
+
+class TokenBucket:
+    """
+    令牌桶限速：每秒补充 rate 个令牌，最多攒 burst 个；rate <= 0 表示不限速
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0: return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _vision_bucket(rate, burst):
+    return TokenBucket(rate, burst)
+
+
+def get_vision_bucket():
+    # 进程级共享：所有会话、所有重跑、命令行的所有视频共用同一个限速桶
+    with _lock:
+        return _vision_bucket(settings.vision_rate_per_sec, settings.vision_rate_burst)
+
+
+@functools.lru_cache(maxsize=None)
+def _openai_client(api_key, base_url, timeout, max_connections, max_keepalive, keepalive_expiry):
+    http_client = DefaultHttpxClient(limits=httpx.Limits(max_connections=max_connections,
+                                                         max_keepalive_connections=max_keepalive,
+                                                         keepalive_expiry=keepalive_expiry))
+    return OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0, http_client=http_client)
+
+
+def _pooled_client(api_key, base_url, timeout):
+    # 进程级共享：同一组配置只建一个客户端，连接（含 TLS 会话）在各次请求、会话与重跑之间保持复用
+    with _lock:
+        return _openai_client(api_key, base_url, timeout, settings.api_max_connections,
+                              settings.api_keepalive_connections, settings.api_keepalive_expiry)
+
+
+def get_vision_client():
+    return _pooled_client(settings.vision_api_key, settings.vision_base_url, settings.api_timeout)
+
+
+def get_audio_client():
+    # 整段音频上传耗时长，超时放宽到 5 倍
+    return _pooled_client(settings.audio_api_key, settings.audio_base_url, settings.api_timeout * 5)
+
+
+def is_retryable(e):
+    if isinstance(e, (APITimeoutError, APIConnectionError, RateLimitError)): return True
+    return isinstance(e, APIStatusError) and e.status_code >= 500
+
+
+def call_api_with_retry(fn, bucket=None, max_retries=None, base_delay=1.0, stats=None):
+    """
+    429 / 5xx / 超时 / 连接错误时指数退避重试，优先遵循服务端的 Retry-After。
+    传入 stats 时写入重试次数、限速等待和退避等待的秒数
+    """
+    if max_retries is None: max_retries = settings.api_max_retries
+    if stats is None: stats = {}
+    stats.update(retries=0, throttle_seconds=0.0, backoff_seconds=0.0)
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            start = time.perf_counter()
+            bucket.acquire()
+            stats["throttle_seconds"] += time.perf_counter() - start
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e): raise
+            stats["retries"] += 1
+            delay = base_delay * (2 ** attempt) + random.uniform(0, base_delay)
+            response = getattr(e, "response", None)
+            if response is not None:
+                try:
+                    delay = max(delay, float(response.headers.get("retry-after", 0)))
+                except ValueError:
+                    pass
+            stats["backoff_seconds"] += delay
+            time.sleep(delay)
+
+
+def parse_json_content(content):
+    return json.loads(content.replace("```json", "").replace("```", "").strip())
+
+
+def vision_cache_key(system_prompt, image_base64, max_tokens):
+    images = [image_base64] if isinstance(image_base64, str) else list(image_base64)
+    return ResultCache.make_key("chat", *images, system_prompt, settings.vision_model, max_tokens)
+
+
+def vision_chat(system_prompt, image_base64, max_tokens=800, parse=None, on_text=None):
+    """
+    所有视觉请求的统一出口：先查结果缓存，未命中时限速 + 重试 + 单次超时地调用模型。
+    image_base64 可以是单张图，也可以是多张图的列表（多张时每张前面带一个“帧 i”标签）。
+    parse 用于把模型文本转成结果，只有解析成功的结果才会写入缓存。
+    传入 on_text 时以 stream=True 请求，每收到一段就以目前为止的全文回调（重试时从头再来），收完再 parse
+    """
+    cache = get_result_cache()
+    key = vision_cache_key(system_prompt, image_base64, max_tokens)
+    start = time.perf_counter()
+    cached = cache.get(key)
+    if cached is not None:
+        add_span("cache.hit", time.perf_counter() - start)
+        return cached
+    content = [{"type": "text", "text": system_prompt}]
+    if isinstance(image_base64, str):
+        images = [image_base64]
+    else:
+        images = list(image_base64)
+    for i, b64 in enumerate(images):
+        if len(images) > 1: content.append({"type": "text", "text": f"帧 {i}"})
+        content.append({"type": "image_url", "image_url": {"url": f"data:{image_mime(b64)};base64,{b64}"}})
+    client = get_vision_client()
+    messages = [{"role": "user", "content": content}]
+
+    def create():
+        if on_text is None:
+            response = client.chat.completions.create(model=settings.vision_model, messages=messages,
+                                                      max_tokens=max_tokens)
+            return response.choices[0].message.content, getattr(response, "usage", None)
+        sent = time.perf_counter()
+        chunks = client.chat.completions.create(model=settings.vision_model, messages=messages, max_tokens=max_tokens,
+                                                stream=True, stream_options={"include_usage": True})
+        # on_text 抛异常（如 Streamlit 重跑打断渲染）时也要关闭响应，连接立即还给连接池
+        with chunks:
+            if "text/event-stream" not in chunks.response.headers.get("content-type", ""):
+                # 不支持流式的兼容服务会直接返回普通 JSON 响应：按普通响应解析，不再重复请求
+                chunks.response.read()
+                response = ChatCompletion.model_validate(chunks.response.json())
+                text = response.choices[0].message.content or ""
+                if text: on_text(text)
+                return text, response.usage
+            text = ""
+            usage = None
+            for chunk in chunks:
+                # include_usage 时 usage 在最后一个（choices 为空的）分片里
+                usage = getattr(chunk, "usage", None) or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta: continue
+                if not text: stats["first_token_seconds"] = time.perf_counter() - sent
+                text += delta
+                on_text(text)
+            return text, usage
+
+    start = time.perf_counter()
+    with span("api.vision", images=len(images), bytes_sent=len(system_prompt.encode("utf-8")) + sum(map(len, images)),
+              stream=on_text is not None) as stats:
+        text, usage = call_api_with_retry(create, bucket=get_vision_bucket(), stats=stats)
+        # 服务端没有返回 usage 时记为 None（未知），不当作 0
+        stats["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+        stats["completion_tokens"] = getattr(usage, "completion_tokens", None)
+    logger.info("视觉请求: %d 张图, prompt %s / completion %s tokens, %.2fs", len(images),
+                getattr(usage, "prompt_tokens", "?"), getattr(usage, "completion_tokens", "?"),
+                time.perf_counter() - start)
+    result = parse(text) if parse else text
+    cache.set(key, result)
+    return result
+
+
+def map_concurrent_ordered(fn, items, max_workers=None):
+    """
+    用线程池并发执行 fn(item)，按原顺序产出 (index, result)：
+    某一项完成后，只要它之前的项都已完成就立即产出，不必等全部结束
+    """
+    if max_workers is None: max_workers = settings.vision_max_in_flight
+    items = list(items)
+    if not items: return
+    done = {}
+    next_i = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        fn = bind(fn)
+        futures = {pool.submit(fn, item): i for i, item in enumerate(items)}
+        for fut in as_completed(futures):
+            done[futures[fut]] = fut.result()
+            while next_i in done:
+                yield next_i, done.pop(next_i)
+                next_i += 1
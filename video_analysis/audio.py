@@ -0,0 +1,174 @@
+"""
+口播转写：ffmpeg 管道流式解码、按静音切片、并发转写
+"""
+import io
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+# 确保安装的是 moviepy==1.0.3（这里只借用它自带的 ffmpeg 可执行文件）
+from moviepy.config import get_setting
+
+from .api import call_api_with_retry, get_audio_client
+from .cache import ResultCache, file_sha256, get_result_cache
+from .config import settings
+from .tracing import add_span, bind, span
+
+FFMPEG_BINARY = get_setting("FFMPEG_BINARY")
+
+# 音频流水线参数：采样率 / 静音判定；分片时长、并发数与直传大小上限见 settings.audio_*
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_SILENCE_DB = -35.0
+
+
+def probe_audio(path):
+    """
+    用 ffmpeg 读取容器信息，返回 {"format", "codec", "channels", "duration"}；没有音轨时 codec 为 None。
+    format 为 ffmpeg 识别出的容器格式（如 "mp3"、"wav"、"mov,mp4,m4a,3gp,3g2,mj2"）
+    """
+    with span("audio.probe"):
+        proc = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-i", path], capture_output=True, text=True,
+                              encoding="utf-8", errors="replace")
+    info = {"format": None, "codec": None, "channels": None, "duration": None}
+    m = re.search(r"Input #0, (.+?), from ", proc.stderr)
+    if m: info["format"] = m.group(1)
+    m = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", proc.stderr)
+    if m: info["duration"] = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+    m = re.search(r"Audio: (\w+)[^,]*, \d+ Hz, ([^,]+)", proc.stderr)
+    if m: info["codec"], info["channels"] = m.group(1), m.group(2).strip()
+    return info
+
+
+def iter_audio_chunks(path, sample_rate=AUDIO_SAMPLE_RATE, chunk_seconds=None, max_seconds=None,
+                      silence_db=AUDIO_SILENCE_DB, window=0.05):
+    """
+    通过 ffmpeg 管道流式解出单声道 16bit PCM，边读边切片：分片达到 chunk_seconds 后
+    在下一个静音窗口处切开，超过 max_seconds 则强制切开。产出 (起始秒, PCM 字节)
+    """
+    if chunk_seconds is None: chunk_seconds = settings.audio_chunk_seconds
+    if max_seconds is None: max_seconds = settings.audio_chunk_max_seconds
+    proc = subprocess.Popen(
+        [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", path, "-vn",
+         "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    window_bytes = int(sample_rate * window) * 2
+    silence_rms = 32768 * 10 ** (silence_db / 20)
+    target_bytes = int(chunk_seconds * sample_rate) * 2
+    max_bytes = int(max_seconds * sample_rate) * 2
+    chunk = bytearray()
+    offset = 0
+    try:
+        while True:
+            block = proc.stdout.read(window_bytes)
+            if not block: break
+            chunk += block
+            if len(chunk) < target_bytes: continue
+            samples = np.frombuffer(block[:len(block) // 2 * 2], dtype=np.int16).astype(np.float32)
+            quiet = samples.size == 0 or np.sqrt(np.mean(samples ** 2)) < silence_rms
+            if quiet or len(chunk) >= max_bytes:
+                yield offset / (2 * sample_rate), bytes(chunk)
+                offset += len(chunk)
+                chunk = bytearray()
+        if chunk:
+            yield offset / (2 * sample_rate), bytes(chunk)
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def pcm_to_wav(pcm, sample_rate=AUDIO_SAMPLE_RATE):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+def _transcript_text(transcript):
+    if isinstance(transcript, str):
+        try:
+            data = json.loads(transcript)
+            if "text" in data: return data["text"]
+        except: pass
+        return transcript
+    return transcript.text
+
+
+def _transcribe_bytes(filename, data):
+    client = get_audio_client()
+    with span("api.audio", bytes_sent=len(data)) as stats:
+        transcript = call_api_with_retry(
+            lambda: client.audio.transcriptions.create(model=settings.audio_model, file=(filename, data),
+                                                       response_format="text"),
+            stats=stats,
+        )
+    return _transcript_text(transcript).strip()
+
+
+def transcribe_audio_segments(video_path, max_workers=None, chunk_seconds=None, max_seconds=None):
+    """
+    流式切片 + 并发转写，返回按时间排序的 [{"start", "end", "text"}]。
+    输入本身是体积不超限的单声道 MP3/WAV 文件时跳过解码，直接整文件上传；
+    MP4 等容器里的 MP3 音轨仍需抽出，否则会把视频流一起上传
+    """
+    if max_workers is None: max_workers = settings.audio_max_in_flight
+    info = probe_audio(video_path)
+    if info["codec"] is None: raise ValueError("文件中没有音轨")
+    direct_ext = {"mp3": "mp3", "pcm_s16le": "wav"}.get(info["codec"])
+    if direct_ext and info["format"] == direct_ext and info["channels"] == "mono" and os.path.getsize(video_path) <= settings.audio_max_upload_mb * 1024 * 1024:
+        with open(video_path, "rb") as f:
+            text = _transcribe_bytes(f"audio.{direct_ext}", f.read())
+        return [{"start": 0.0, "end": info["duration"] or 0.0, "text": text}]
+
+    # 分片一边从 ffmpeg 管道里出来一边提交转写；信号量限制排队中的分片数，内存占用有上限
+    slots = threading.BoundedSemaphore(max_workers * 2)
+    futures = []
+    transcribe = bind(_transcribe_bytes)
+    chunks = iter_audio_chunks(video_path, chunk_seconds=chunk_seconds, max_seconds=max_seconds)
+    decode_seconds = 0.0
+    decoded = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while True:
+            # 只统计等 ffmpeg 出数据的时间，不含等待转写名额
+            t = time.perf_counter()
+            item = next(chunks, None)
+            decode_seconds += time.perf_counter() - t
+            if item is None: break
+            start, pcm = item
+            decoded += len(pcm)
+            slots.acquire()
+            end = start + len(pcm) / (2 * AUDIO_SAMPLE_RATE)
+            fut = pool.submit(transcribe, f"chunk_{len(futures):04d}.wav", pcm_to_wav(pcm))
+            fut.add_done_callback(lambda _: slots.release())
+            futures.append((start, end, fut))
+        add_span("audio.decode", decode_seconds, bytes=decoded, chunks=len(futures))
+        return [{"start": start, "end": end, "text": fut.result()} for start, end, fut in futures]
+
+
+def cached_transcript_segments(video_path, file_hash=None):
+    # 以源文件内容哈希为键：同一文件再次上传时连音频解码都跳过
+    cache = get_result_cache()
+    key = ResultCache.make_key("transcribe-segments", file_hash or file_sha256(video_path), settings.audio_model,
+                               settings.audio_chunk_seconds, settings.audio_chunk_max_seconds)
+    cached = cache.get(key)
+    if cached is not None: return cached
+    segments = transcribe_audio_segments(video_path)
+    cache.set(key, segments)
+    return segments
+
+
+def transcribe_audio_api(video_path):
+    try:
+        return "\n".join(seg["text"] for seg in cached_transcript_segments(video_path) if seg["text"])
+    except Exception as e:
+        return f"Audio Error: {str(e)}"
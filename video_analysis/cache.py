@@ -0,0 +1,105 @@
+"""
+SQLite 内容寻址结果缓存
+"""
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .config import settings
+
+
+class ResultCache:
+    """
+    SQLite 内容寻址结果缓存：键为媒体字节哈希 + 提示词 + 模型 + max_tokens，
+    超过 TTL 的条目失效，总大小超限时按最近访问时间 (LRU) 淘汰
+    """
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, ttl=30 * 86400):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(*parts):
+        h = hashlib.sha256()
+        for part in parts:
+            data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+            h.update(hashlib.sha256(data).digest())
+        return h.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes: return
+        stale = []
+        for key, size in self.conn.execute("SELECT key, size FROM results ORDER BY accessed"):
+            if total <= self.max_bytes: break
+            stale.append((key,))
+            total -= size
+        self.conn.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _result_cache(cache_dir, max_bytes, ttl):
+    return ResultCache(os.path.join(cache_dir, "results.sqlite3"), max_bytes, ttl)
+
+
+def get_result_cache():
+    # 进程级共享：同一配置下所有会话、所有线程共用一个缓存连接
+    with _lock:
+        return _result_cache(settings.cache_dir, int(settings.cache_max_mb * 1024 * 1024),
+                             settings.cache_ttl_days * 86400)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,256 @@
+"""
+命令行批处理：python -m video_analysis 视频或目录... -o 输出目录
+
+切镜检测与帧编码在进程池中并行（CPU 密集），所有视频的视觉请求共用一个线程池与同一个限速桶。
+每个视频输出一个 JSONL 文件，先写 .part 完成后再改名；重跑时已完成的视频直接跳过，
+未完成视频中已分析过的帧会命中结果缓存，不会重复请求
+"""
+import argparse
+import dataclasses
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from .audio import cached_transcript_segments
+from .cache import file_sha256
+from .config import Settings, configure, find_secrets_file, settings
+from .dedup import ShotIndex, frame_phash, is_reusable, mark_repeat, plan_repeats
+from .encoding import get_image_base64
+from .scenes import compute_scene_timeline, keyframes_from_timeline, select_scene_cuts
+from .tracing import Trace, bind
+from .vision import analyze_video_frame_reconstruction, analyze_video_frames_batch, frame_batch_size
+
+logger = logging.getLogger("video_analysis")
+
+VIDEO_EXTS = (".mp4", ".mov", ".avi", ".mkv")
+
+
+def collect_videos(inputs):
+    # 输入可以是文件、目录（递归查找）或 glob 模式；按路径去重并排序
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                found.update(os.path.join(root, n) for n in names if n.lower().endswith(VIDEO_EXTS))
+        elif os.path.isfile(item):
+            found.add(item)
+        else:
+            found.update(p for p in glob.glob(item, recursive=True)
+                         if os.path.isfile(p) and p.lower().endswith(VIDEO_EXTS))
+    return sorted(os.path.abspath(p) for p in found)
+
+
+def output_paths(videos, out_dir):
+    # 输出文件以视频文件名命名；不同目录下文件名重复时追加路径哈希
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in videos]
+    paths = {}
+    for path, stem in zip(videos, stems):
+        if stems.count(stem) > 1:
+            stem = f"{stem}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]}"
+        paths[path] = os.path.join(out_dir, stem + ".jsonl")
+    return paths
+
+
+def detect_video(video_path, threshold):
+    """
+    进程池中执行：切镜检测 + 关键帧编码，返回可 pickle 的 dict（图像为 base64，附带本进程记录的 span）
+    """
+    trace = Trace("detect")
+    with trace.activate():
+        detected = _detect_video(video_path, threshold)
+    detected["trace"] = {"started": trace.started, "spans": trace.spans}
+    return detected
+
+
+def _detect_video(video_path, threshold):
+    file_hash = file_sha256(video_path)
+    # 已经按视频多进程并行，单个视频内不再分段
+    timeline = compute_scene_timeline(video_path, workers=1)
+    cuts = select_scene_cuts(timeline, threshold)
+    store = keyframes_from_timeline(video_path, timeline, cuts)
+    duration = timeline["stats"]["frames"] / timeline["fps"]
+    shots = []
+    for i in range(len(store)):
+        frame = store.frame(i)
+        end = store.timestamps[i + 1] if i + 1 < len(store) else duration
+        shots.append({"index": i, "frame_id": store.frame_ids[i], "start": store.timestamps[i], "end": end,
+                      "image": get_image_base64(frame) if frame is not None else None,
+                      "phash": frame_phash(frame) if frame is not None else None})
+    return {"path": video_path, "sha256": file_hash, "fps": timeline["fps"], "duration": duration,
+            "detect": timeline["stats"], "shots": shots}
+
+
+def analyze_shot_batch(images):
+    if len(images) == 1: return [analyze_video_frame_reconstruction(images[0])]
+    return analyze_video_frames_batch(images)
+
+
+class VideoJob:
+    """
+    单个视频在 API 阶段的状态：所有批次完成后按镜头顺序写出 JSONL。
+    plan 为 plan_repeats 的结果，重复镜头写出时复用来源镜头的分析
+    """
+    def __init__(self, detected, out_path, plan, trace):
+        self.detected = detected
+        self.out_path = out_path
+        self.plan = plan
+        self.trace = trace
+        self.results = {}
+        self.transcript = None
+        self.pending = set()
+
+    def write(self):
+        d = self.detected
+        part_path = self.out_path + ".part"
+        self.trace.finish()
+        with open(part_path, "w", encoding="utf-8") as f:
+            header = {"type": "video", "path": d["path"], "sha256": d["sha256"], "fps": d["fps"],
+                      "duration": d["duration"], "shots": len(d["shots"]), "detect": d["detect"],
+                      "timing": self.trace.summary()}
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for shot in d["shots"]:
+                line = {"type": "shot", **{k: v for k, v in shot.items() if k not in ("image", "phash")}}
+                line.update(self.result(shot["index"]))
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            if self.transcript is not None:
+                f.write(json.dumps({"type": "transcript", **self.transcript}, ensure_ascii=False) + "\n")
+        os.replace(part_path, self.out_path)
+
+    def result(self, i):
+        plan = self.plan[i]
+        if plan is None:
+            return self.results.get(i) or {"cn_desc": "解析失败", "en_prompt": "帧读取失败"}
+        if plan[0] == "video":
+            j = plan[1]
+            res = self.result(j)
+            if not is_reusable(res): return res
+            return mark_repeat(res, os.path.basename(self.detected["path"]), self.detected["shots"][j]["start"])
+        entry = plan[1]
+        return entry["result"] if entry["self"] else mark_repeat(entry["result"], entry["source"], entry["time"])
+
+
+def run_batch(videos, out_dir, threshold=25.0, workers=None, api_workers=None, transcribe=False, max_pending=None):
+    """
+    处理一批视频，返回 (完成数, 失败数)。max_pending 限制已检测完、正在等 API 的视频数（背压）。
+    整批共用一个重复镜头索引：后处理的视频可以复用前面视频已分析过的镜头
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    api_workers = api_workers or settings.vision_max_in_flight
+    max_pending = max_pending or workers * 2
+    batch_size = frame_batch_size()
+    outputs = output_paths(videos, out_dir)
+    shot_index = ShotIndex()
+    todo = [p for p in videos if not os.path.exists(outputs[p])]
+    logger.info("共 %d 个视频，%d 个已完成跳过", len(videos), len(videos) - len(todo))
+    todo.reverse()
+    done_count = failed = 0
+    jobs = {}
+    traces = {}
+    futures = {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure, initargs=(settings,)) as procs, \
+            ThreadPoolExecutor(max_workers=max(1, api_workers)) as api:
+        def submit_detect():
+            while todo and sum(1 for kind, _ in futures.values() if kind == "detect") + len(jobs) < max_pending:
+                path = todo.pop()
+                traces[path] = Trace("cli_video", file=os.path.basename(path))
+                futures[procs.submit(detect_video, path, threshold)] = ("detect", path)
+
+        def submit_api(job, kind, key, fn, *args):
+            with job.trace.activate():
+                f = api.submit(bind(fn), *args)
+            futures[f] = (kind, key)
+            job.pending.add(f)
+
+        def finish(path):
+            nonlocal done_count
+            job = jobs.pop(path)
+            job.write()
+            done_count += 1
+            logger.info("[%d/%d] 已写出 %s", done_count, len(videos), job.out_path)
+
+        submit_detect()
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                kind, key = futures.pop(fut)
+                if kind == "detect":
+                    trace = traces.pop(key)
+                    try:
+                        detected = fut.result()
+                    except Exception as e:
+                        logger.error("切镜检测失败 %s: %s", key, e)
+                        failed += 1
+                        continue
+                    worker = detected.pop("trace")
+                    trace.extend(worker["spans"], offset=worker["started"] - trace.started)
+                    shots = detected["shots"]
+                    plan = plan_repeats([s["phash"] for s in shots], [s["frame_id"] for s in shots], shot_index, key)
+                    job = jobs[key] = VideoJob(detected, outputs[key], plan, trace)
+                    shots = [s for s in shots if s["image"] is not None and plan[s["index"]] is None]
+                    for k in range(0, len(shots), batch_size):
+                        batch = shots[k:k + batch_size]
+                        submit_api(job, "vision", (key, [s["index"] for s in batch]), analyze_shot_batch,
+                                   [s["image"] for s in batch])
+                    if transcribe:
+                        submit_api(job, "audio", (key, None), cached_transcript_segments, key, detected["sha256"])
+                    logger.info("检测完成 %s: %d 个镜头（%d 个重复镜头复用已有分析）, %.0f fps", os.path.basename(key),
+                                len(detected["shots"]), len(detected["shots"]) - len(shots), detected["detect"]["fps"])
+                    # 没有可分析的镜头、或全部镜头都复用了已有分析时没有待完成的请求，直接写出，不占背压名额
+                    if not job.pending: finish(key)
+                else:
+                    path, indices = key
+                    job = jobs[path]
+                    job.pending.discard(fut)
+                    try:
+                        result, error = fut.result(), None
+                    except Exception as e:
+                        logger.error("%s 失败 %s: %s", "画面分析" if kind == "vision" else "口播转写", path, e)
+                        result, error = None, str(e)
+                    if kind == "vision":
+                        for i, res in zip(indices, result or [{"cn_desc": "解析失败", "en_prompt": error}] * len(indices)):
+                            job.results[i] = res
+                            shot = job.detected["shots"][i]
+                            if is_reusable(res):
+                                shot_index.add(shot["phash"], {"result": res, "video": path,
+                                                               "source": os.path.basename(path),
+                                                               "frame_id": shot["frame_id"], "time": shot["start"]})
+                    else:
+                        job.transcript = {"segments": result} if error is None else {"error": error}
+                    if not job.pending: finish(path)
+            submit_detect()
+    return done_count, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m video_analysis", description="批量视频切镜与画面反推")
+    parser.add_argument("inputs", nargs="+", help="视频文件、目录或 glob 模式")
+    parser.add_argument("-o", "--output", required=True, help="JSONL 输出目录")
+    parser.add_argument("--secrets", help="secrets.toml 路径（默认与 Streamlit 相同的查找位置）")
+    parser.add_argument("--threshold", type=float, default=25.0, help="切镜灵敏度，与界面滑块含义一致")
+    parser.add_argument("--workers", type=int, default=None, help="切镜检测进程数（默认 CPU 核数）")
+    parser.add_argument("--api-concurrency", type=int, default=None, help="同时在途的视觉请求数")
+    parser.add_argument("--transcribe", action="store_true", help="同时转写口播")
+    parser.add_argument("--metrics-log", help="把每个视频的耗时明细追加到该 JSONL 文件（覆盖 [perf] metrics_log）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    secrets_path = args.secrets or find_secrets_file()
+    if not secrets_path: parser.error("找不到 secrets.toml，请用 --secrets 指定")
+    try:
+        configure(Settings.from_toml(secrets_path))
+    except Exception as e:
+        parser.error(f"配置缺失: {e}。请检查 {secrets_path}")
+    if args.metrics_log: configure(dataclasses.replace(settings, metrics_log=args.metrics_log))
+    videos = collect_videos(args.inputs)
+    if not videos: parser.error("没有找到视频文件")
+    start = time.perf_counter()
+    done_count, failed = run_batch(videos, args.output, args.threshold, args.workers, args.api_concurrency,
+                                   args.transcribe)
+    logger.info("完成 %d 个视频，失败 %d 个，用时 %.1fs", done_count, failed, time.perf_counter() - start)
+    return 1 if failed else 0
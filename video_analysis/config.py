@@ -0,0 +1,87 @@
+"""
+配置：API 密钥与性能参数。
+Streamlit 界面用 st.secrets 构造，命令行直接读取 secrets.toml；各模块在调用时读取 settings
+"""
+import os
+import tempfile
+import tomllib
+from dataclasses import dataclass, fields
+
+
+@dataclass
+class Settings:
+    vision_api_key: str = ""
+    vision_base_url: str = ""
+    vision_model: str = ""
+    audio_api_key: str = ""
+    audio_base_url: str = ""
+    audio_model: str = ""
+
+    # 以下字段都可以在 secrets.toml 的 [perf] 段中按同名键覆盖
+    vision_max_in_flight: int = 4       # 同时在途的视觉请求数
+    vision_rate_per_sec: float = 5.0    # 令牌桶：每秒发放请求数 (<=0 不限速)
+    vision_rate_burst: int = 8          # 令牌桶容量
+    vision_batch_size: int = 1          # 视频拆解每个请求打包的关键帧数 (1 为逐帧，受 token 预算限制最多 5 帧)
+    api_max_retries: int = 3            # 429/5xx/超时 的重试次数
+    api_timeout: float = 60.0           # 单次请求超时（秒）
+    api_max_connections: int = 20       # 共享客户端连接池：最大连接数
+    api_keepalive_connections: int = 10 # 空闲时保持的长连接数
+    api_keepalive_expiry: float = 30.0  # 空闲长连接保留秒数
+    cache_dir: str = os.path.join(os.path.expanduser("~"), ".cache", "video-analysis-tool")
+    cache_max_mb: float = 512           # 结果缓存总大小上限
+    cache_ttl_days: float = 30          # 结果缓存过期时间
+    upload_dir: str = os.path.join(tempfile.gettempdir(), "video-analysis-uploads")
+    upload_max_mb: float = 4096         # 上传落盘目录总大小上限
+    upload_max_age_hours: float = 24    # 落盘文件最长保留时间
+    upload_grace_minutes: float = 30    # 这段时间内用过的落盘文件不做大小淘汰（其他会话可能仍在回读）
+    scene_workers: int = 0              # 切镜检测分段解码线程数（0 为 CPU 核数，1 为不分段）
+    scene_segment_min_frames: int = 3000  # 分段并行时每段最少帧数，短视频不值得分段
+    keyframe_queue_size: int = 8        # 边检测边分析时待分析关键帧的队列长度，满了暂停解码
+    keyframe_spill_dir: str = ""        # 不为空时关键帧全分辨率落盘 (memmap)，否则按需回读视频
+    metrics_log: str = ""               # 不为空时把每次运行的耗时明细按行追加到该 JSONL 文件
+    dedup_max_distance: int = 8         # 重复镜头判定的 pHash 汉明距离上限（负数关闭复用）
+    image_max_side: int = 1568          # 视觉请求图像长边上限
+    image_format: str = "jpeg"          # jpeg | webp
+    image_quality: int = 85             # 初始编码质量
+    image_max_kb: float = 400           # 单张图体积预算（0 表示不限）
+    audio_chunk_seconds: float = 120    # 音频分片目标时长
+    audio_chunk_max_seconds: float = 300  # 音频分片时长上限
+    audio_max_in_flight: int = 4        # 同时在途的转写请求数
+    audio_max_upload_mb: float = 24     # 单声道 MP3/WAV 直传的大小上限
+
+    @classmethod
+    def from_mapping(cls, secrets):
+        # secrets 为 {"vision": {...}, "audio": {...}, "perf": {...}} 结构（st.secrets 或 toml）
+        values = {}
+        for section in ("vision", "audio"):
+            for key in ("api_key", "base_url", "model"):
+                values[f"{section}_{key}"] = secrets[section][key]
+        perf = dict(secrets.get("perf", {}))
+        for f in fields(cls):
+            if f.name in perf:
+                values[f.name] = type(f.default)(perf[f.name])
+        return cls(**values)
+
+    @classmethod
+    def from_toml(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_mapping(tomllib.load(f))
+
+
+settings = Settings()
+
+
+def configure(new_settings):
+    # 原地更新，保证各模块 `from .config import settings` 拿到的是同一个对象
+    for f in fields(Settings):
+        setattr(settings, f.name, getattr(new_settings, f.name))
+    return settings
+
+
+def find_secrets_file():
+    # 与 Streamlit 相同的查找顺序：当前目录优先，其次用户目录
+    for path in (os.path.join(os.getcwd(), ".streamlit", "secrets.toml"),
+                 os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml")):
+        if os.path.exists(path):
+            return path
+    return None
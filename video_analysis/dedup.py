@@ -0,0 +1,132 @@
+"""
+重复镜头索引：关键帧感知哈希 (pHash) + BK 树汉明距离查找。
+正反打、反复切回的主持人近景、同一个产品特写只分析一次，其余直接复用结果
+"""
+import threading
+
+import cv2
+import numpy as np
+
+from .config import settings
+
+PHASH_SIZE = 32
+PHASH_BITS = 8
+
+
+def frame_phash(frame):
+    """
+    64 位 pHash：上方 80% 区域（避开字幕）缩到 32x32 灰度图做 DCT，
+    取左上 8x8 低频系数（去掉直流分量）与中位数比较
+    """
+    cropped_frame = frame[0:int(frame.shape[0] * 0.8), :]
+    gray = cv2.cvtColor(cropped_frame, cv2.COLOR_BGR2GRAY) if cropped_frame.ndim == 3 else cropped_frame
+    small = cv2.resize(gray, (PHASH_SIZE, PHASH_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:PHASH_BITS, :PHASH_BITS].ravel()
+    bits = low > np.median(low[1:])
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    汉明距离 BK 树：节点为 [哈希, 值, {距离: 子节点}]，按三角不等式剪枝查找半径内最近的项
+    """
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, key, value):
+        node = [key, value, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        cur = self.root
+        while True:
+            d = hamming(key, cur[0])
+            if d not in cur[2]:
+                cur[2][d] = node
+                return
+            cur = cur[2][d]
+
+    def nearest(self, key, radius):
+        # 返回 (距离, 值)，半径内没有时返回 None
+        best = None
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_key, value, children = stack.pop()
+            d = hamming(key, node_key)
+            if d <= radius and (best is None or d < best[0]):
+                best = (d, value)
+            stack.extend(child for cd, child in children.items() if d - radius <= cd <= d + radius)
+        return best
+
+
+class ShotIndex:
+    """
+    跨视频的已分析镜头索引：值为 {"result", "video", "source", "frame_id", "time"}。
+    界面中每个会话一个，命令行中每次批处理一个
+    """
+    def __init__(self, max_distance=None):
+        self.max_distance = settings.dedup_max_distance if max_distance is None else max_distance
+        self.tree = BKTree()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.tree)
+
+    def add(self, key, entry):
+        with self.lock:
+            self.tree.add(key, entry)
+
+    def lookup(self, key):
+        with self.lock:
+            hit = self.tree.nearest(key, self.max_distance)
+        return hit[1] if hit else None
+
+
+class RepeatPlanner:
+    """
+    逐个关键帧决定是否需要调用 API：plan() 返回 None 表示需要分析；("video", j) 表示与本视频第 j 个关键帧重复；
+    ("index", entry) 表示命中索引中已分析过的镜头（同一视频同一帧时 entry["self"] 为真，不算重复）。
+    关键帧须按时间顺序传入，边检测边分析时可逐帧调用
+    """
+    def __init__(self, shot_index, video_key):
+        self.shot_index = shot_index
+        self.video_key = video_key
+        self.active = shot_index is not None and shot_index.max_distance >= 0
+        self._local = BKTree()
+        self._count = 0
+
+    def plan(self, key, frame_id):
+        i = self._count
+        self._count += 1
+        if key is None or not self.active: return None
+        entry = self.shot_index.lookup(key)
+        if entry is not None:
+            return ("index", dict(entry, self=entry["video"] == self.video_key and entry["frame_id"] == frame_id))
+        hit = self._local.nearest(key, self.shot_index.max_distance)
+        if hit is not None: return ("video", hit[1])
+        self._local.add(key, i)
+        return None
+
+
+def plan_repeats(hashes, frame_ids, shot_index, video_key):
+    # 整段视频的关键帧一次性规划，返回与输入等长的列表，含义同 RepeatPlanner.plan
+    planner = RepeatPlanner(shot_index, video_key)
+    return [planner.plan(key, frame_id) for key, frame_id in zip(hashes, frame_ids)]
+
+
+def mark_repeat(result, source, time):
+    # 复用的结果加上来源标记，不改动缓存里的原对象
+    return dict(result, repeat_of={"source": source, "time": time})
+
+
+def is_reusable(result):
+    return isinstance(result, dict) and result.get("cn_desc") != "解析失败"
@@ -0,0 +1,81 @@
+"""
+视觉请求的图像编码
+"""
+import base64
+import logging
+
+import cv2
+import numpy as np
+
+from .config import settings
+from .tracing import span
+
+logger = logging.getLogger("video_analysis")
+
+IMAGE_MIN_QUALITY = 50
+IMAGE_MIN_SIDE = 384
+
+
+def _to_bgr(image_array):
+    # 统一成 8bit BGR：灰度图扩成三通道，带透明通道的 PNG 合成到白底上
+    img = image_array
+    if img.dtype == np.uint16:
+        img = (img // 257).astype(np.uint8)
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    if img.shape[2] == 4:
+        alpha = img[:, :, 3:4].astype(np.float32) / 255.0
+        return (img[:, :, :3].astype(np.float32) * alpha + 255.0 * (1 - alpha)).astype(np.uint8)
+    return img
+
+
+def encode_image(image_array, max_side=None, fmt=None, quality=None, max_bytes=None):
+    """
+    直接用 cv2.imencode 压缩图像，返回编码后的字节：先把长边缩到 max_side，
+    超出体积预算时逐级降低质量，降到 IMAGE_MIN_QUALITY 后再继续缩小尺寸。
+    参数缺省时取 settings 中的 image_* 配置
+    """
+    max_side = settings.image_max_side if max_side is None else max_side
+    fmt = (settings.image_format if fmt is None else fmt).lower()
+    quality = settings.image_quality if quality is None else quality
+    max_bytes = int(settings.image_max_kb * 1024) if max_bytes is None else max_bytes
+    img = _to_bgr(image_array)
+    h, w = img.shape[:2]
+    if max_side and max(h, w) > max_side:
+        scale = max_side / max(h, w)
+        img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    ext, flag = (".webp", cv2.IMWRITE_WEBP_QUALITY) if fmt == "webp" else (".jpg", cv2.IMWRITE_JPEG_QUALITY)
+    while True:
+        ok, buf = cv2.imencode(ext, img, [flag, quality])
+        if not ok: raise ValueError("图像编码失败")
+        if not max_bytes or buf.size <= max_bytes: break
+        if quality > IMAGE_MIN_QUALITY:
+            quality = max(IMAGE_MIN_QUALITY, quality - 10)
+        elif max(img.shape[:2]) > IMAGE_MIN_SIDE:
+            img = cv2.resize(img, None, fx=0.75, fy=0.75, interpolation=cv2.INTER_AREA)
+        else:
+            break
+    return buf.tobytes()
+
+
+def get_image_base64(image_array, source_bytes=None):
+    with span("image.encode", bytes_in=source_bytes or image_array.nbytes) as stats:
+        data = encode_image(image_array)
+        stats["bytes_out"] = len(data)
+    logger.info("图像编码: %dx%d 原始 %d 字节 -> 发送 %d 字节 (%s)", image_array.shape[1], image_array.shape[0],
+                source_bytes or image_array.nbytes, len(data), settings.image_format)
+    return base64.b64encode(data).decode('utf-8')
+
+
+def image_mime(image_base64):
+    # 根据 base64 开头的文件签名判断 data URL 的 MIME 类型
+    if image_base64.startswith("UklGR"): return "image/webp"
+    if image_base64.startswith("iVBOR"): return "image/png"
+    return "image/jpeg"
+
+
+# 新增：用于下载图片的转换函数
+def convert_frame_to_bytes(frame_array):
+    # OpenCV BGR -> PNG Bytes
+    ok, buf = cv2.imencode(".png", frame_array)
+    return buf.tobytes()
@@ -0,0 +1,109 @@
+"""
+视频帧读取与关键帧仓库
+"""
+import os
+import tempfile
+import weakref
+
+import cv2
+import numpy as np
+
+from .config import settings
+from .encoding import convert_frame_to_bytes
+from .tracing import span
+
+# 关键帧缩略图宽度与 JPEG 质量；settings.keyframe_spill_dir 不为空时全分辨率帧落盘 (memmap)，否则按需回读视频
+KEYFRAME_THUMB_WIDTH = 640
+KEYFRAME_THUMB_QUALITY = 85
+
+
+def get_frame_at_index(video_path, frame_id):
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+    ret, frame = cap.read()
+    cap.release()
+    return frame if ret else None
+
+
+def get_frame_at_time(video_path, time_sec=1.5):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    if fps == 0: fps = 30.0
+    return get_frame_at_index(video_path, int(fps * time_sec))
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class KeyframeStore:
+    """
+    关键帧仓库：检测时只保存缩略图 JPEG、帧号和时间戳，
+    全分辨率帧在需要时（调用 API / 下载）从视频回读或从落盘的 memmap 中读取。
+    add() 不传帧时缩略图延迟到第一次回读该帧时生成；spill_dir 为 None 时取 settings
+    """
+    def __init__(self, video_path, fps, spill_dir=None,
+                 thumb_width=KEYFRAME_THUMB_WIDTH, thumb_quality=KEYFRAME_THUMB_QUALITY):
+        if spill_dir is None: spill_dir = settings.keyframe_spill_dir
+        self.video_path = video_path
+        self.fps = fps
+        self.thumb_width = thumb_width
+        self.thumb_quality = thumb_quality
+        self.frame_ids = []
+        self.timestamps = []
+        self.thumbnails = []
+        self._spill_path = None
+        self._spill_shape = None
+        self._spill_slots = {}
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            fd, self._spill_path = tempfile.mkstemp(suffix=".frames", dir=spill_dir)
+            os.close(fd)
+            weakref.finalize(self, remove_file, self._spill_path)
+
+    def __len__(self):
+        return len(self.frame_ids)
+
+    def add(self, frame_id, frame=None):
+        self.frame_ids.append(frame_id)
+        self.timestamps.append(frame_id / self.fps)
+        self.thumbnails.append(self._make_thumbnail(frame) if frame is not None else None)
+        if self._spill_path and frame is not None:
+            if self._spill_shape is None: self._spill_shape = frame.shape
+            self._spill_slots[len(self.frame_ids) - 1] = len(self._spill_slots)
+            with open(self._spill_path, "ab") as f:
+                f.write(np.ascontiguousarray(frame).tobytes())
+
+    def _make_thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        if w > self.thumb_width:
+            frame = cv2.resize(frame, (self.thumb_width, max(1, round(h * self.thumb_width / w))),
+                               interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.thumb_quality])
+        return buf.tobytes()
+
+    def frame(self, i):
+        # 取第 i 个关键帧的全分辨率 BGR 图像
+        if i in self._spill_slots:
+            size = int(np.prod(self._spill_shape))
+            with span("frame.read", source="spill"):
+                mm = np.memmap(self._spill_path, dtype=np.uint8, mode="r",
+                               offset=self._spill_slots[i] * size, shape=self._spill_shape)
+                return np.array(mm)
+        with span("frame.read", source="video"):
+            frame = get_frame_at_index(self.video_path, self.frame_ids[i])
+        if frame is not None and self.thumbnails[i] is None:
+            self.thumbnails[i] = self._make_thumbnail(frame)
+        return frame
+
+    def thumbnail(self, i):
+        if self.thumbnails[i] is None: self.frame(i)
+        return self.thumbnails[i]
+
+    def png_bytes(self, i):
+        frame = self.frame(i)
+        return convert_frame_to_bytes(frame) if frame is not None else b""
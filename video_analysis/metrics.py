@@ -0,0 +1,35 @@
+"""
+汇总 Trace.finish() 写出的指标日志（settings.metrics_log），按页签与阶段统计 p50 / p95：
+
+    python -m video_analysis.metrics metrics.jsonl
+"""
+import json
+import sys
+
+import numpy as np
+
+
+def summarize_metrics(path):
+    """
+    汇总指标日志：按 (trace, span) 统计次数与 p50 / p95 耗时
+    """
+    groups = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip(): continue
+            row = json.loads(line)
+            groups.setdefault((row["trace"], row["span"]), []).append(row["seconds"])
+    rows = []
+    for (trace, name), values in sorted(groups.items()):
+        values = np.array(values)
+        rows.append({"trace": trace, "span": name, "count": len(values),
+                     "p50": round(float(np.percentile(values, 50)), 4),
+                     "p95": round(float(np.percentile(values, 95)), 4)})
+    return rows
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2: sys.exit("用法: python -m video_analysis.metrics metrics.jsonl")
+    print(f"{'trace':<12} {'span':<24} {'count':>7} {'p50(s)':>10} {'p95(s)':>10}")
+    for row in summarize_metrics(sys.argv[1]):
+        print(f"{row['trace']:<12} {row['span']:<24} {row['count']:>7} {row['p50']:>10.4f} {row['p95']:>10.4f}")
@@ -0,0 +1,114 @@
+"""
+全片 OCR：本地检测固定文字变化，只把变化帧送去识别并合并成时间轴
+"""
+import difflib
+import re
+import time
+
+import cv2
+import numpy as np
+
+from .api import map_concurrent_ordered
+from .encoding import get_image_base64
+from .frames import KeyframeStore
+from .scenes import iter_sampled_frames
+from .tracing import add_span
+from .vision import analyze_ocr_text
+
+# 全片 OCR 参数：采样间隔 / 文字信号计算宽度 / 判定为变化的边缘差异 / 需连续稳定的采样数 / 最低边缘密度
+OCR_SAMPLE_SECONDS = 0.5
+OCR_SIGNAL_WIDTH = 320
+OCR_CHANGE_THRESHOLD = 0.35
+OCR_STABLE_SAMPLES = 2
+OCR_MIN_EDGE_DENSITY = 0.005
+
+
+def compute_text_signal(frame, width=OCR_SIGNAL_WIDTH):
+    # 上方 80% 区域（避开底部字幕）缩小后的 Canny 边缘图，文字笔画边缘密集
+    cropped_frame = frame[0:int(frame.shape[0] * 0.8), :]
+    if cropped_frame.shape[1] > width:
+        h = max(1, round(cropped_frame.shape[0] * width / cropped_frame.shape[1]))
+        cropped_frame = cv2.resize(cropped_frame, (width, h), interpolation=cv2.INTER_AREA)
+    edges = cv2.Canny(cv2.cvtColor(cropped_frame, cv2.COLOR_BGR2GRAY), 100, 200)
+    return cv2.dilate(edges, np.ones((3, 3), np.uint8)) > 0
+
+
+def text_signal_change(a, b):
+    # 两张边缘图的 Jaccard 距离：0 表示完全相同
+    union = np.count_nonzero(a | b)
+    return np.count_nonzero(a ^ b) / union if union else 0.0
+
+
+def detect_text_changes(video_path, sample_seconds=OCR_SAMPLE_SECONDS, change_threshold=OCR_CHANGE_THRESHOLD,
+                        stable_samples=OCR_STABLE_SAMPLES, min_density=OCR_MIN_EDGE_DENSITY):
+    """
+    本地扫描整段视频，找出固定文字发生变化的时刻，返回 (KeyframeStore, stats)。
+    只保留相邻两个采样点都存在的“静态边缘”（固定文字、静止背景），过滤运动画面；
+    静态边缘与当前文字状态差异超过阈值、且连续 stable_samples 个采样稳定时记为一次变化
+    """
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps == 0: fps = 30.0
+    store = KeyframeStore(video_path, fps)
+    prev_mask = None
+    current = None
+    pending = None
+    samples = 0
+    for frame_id, frame in iter_sampled_frames(cap, max(1, round(fps * sample_seconds))):
+        samples += 1
+        mask = compute_text_signal(frame)
+        static = mask if prev_mask is None else mask & prev_mask
+        prev_mask = mask
+        if current is not None and text_signal_change(current, static) <= change_threshold:
+            pending = None
+            continue
+        if pending is not None and text_signal_change(pending["mask"], static) <= change_threshold:
+            pending["count"] += 1
+        else:
+            pending = {"frame_id": frame_id, "frame": frame, "mask": static, "count": 1}
+        if pending["count"] >= stable_samples:
+            current = pending["mask"]
+            if current.mean() >= min_density:
+                store.add(pending["frame_id"], pending["frame"])
+            pending = None
+    duration = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) / fps
+    cap.release()
+    elapsed = time.perf_counter() - start
+    add_span("ocr.scan", elapsed, samples=samples, changes=len(store))
+    return store, {"samples": samples, "changes": len(store), "duration": duration, "seconds": elapsed}
+
+
+def _normalize_ocr_text(text):
+    return re.sub(r"\s+", "", text or "")
+
+
+def build_ocr_timeline(timestamps, texts, duration, min_ratio=0.9):
+    """
+    把各变化时刻的 OCR 结果合并成时间轴：相邻结果文字基本一致时视为同一段，
+    返回 [{"start", "end", "text", "index"}]，index 为该段第一帧在关键帧仓库中的下标
+    """
+    entries = []
+    for i, (ts, text) in enumerate(zip(timestamps, texts)):
+        key = _normalize_ocr_text(text)
+        if entries and difflib.SequenceMatcher(None, entries[-1]["key"], key).ratio() >= min_ratio:
+            continue
+        if entries: entries[-1]["end"] = ts
+        entries.append({"start": ts, "end": duration, "text": text, "index": i, "key": key})
+    for entry in entries:
+        del entry["key"]
+    return entries
+
+
+def _ocr_keyframe(store, i):
+    frame = store.frame(i)
+    # 回读失败时与识别出错一样记一条错误文本，不中断整个时间轴
+    return analyze_ocr_text(get_image_base64(frame)) if frame is not None else "OCR Error: 帧读取失败"
+
+
+def ocr_video_timeline(video_path):
+    # 全片 OCR：本地找文字变化帧，只把这些帧并发送去识别，再合并去重成时间轴
+    store, stats = detect_text_changes(video_path)
+    texts = [text for _, text in map_concurrent_ordered(lambda i: _ocr_keyframe(store, i), range(len(store)))]
+    stats["api_calls"] = len(texts)
+    return build_ocr_timeline(store.timestamps, texts, stats["duration"]), store, stats
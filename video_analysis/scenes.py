@@ -0,0 +1,307 @@
+"""
+切镜检测：单遍逐帧检测与两段式（直方图时间线 + 阈值选取）检测。
+长视频的第一段可按步长对齐切成多段，在多个线程中各自打开 capture 解码后拼接，结果与单线程逐位一致
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .config import settings
+from .frames import KeyframeStore
+from .tracing import add_span
+
+# 快速切镜检测参数：采样步长 / 直方图计算宽度 / H-S 分箱数 / 超过多少帧改用 seek 跳帧。
+# 注意：默认在 320px 宽的缩略图上算 30x32 分箱直方图，与旧检测器（全分辨率、180x256 分箱）的差异值并不逐位相同，
+# 同一阈值下个别切点可能多一个或少一个（界面滑块的说明里写明了这一点）。换成 180x256 分箱后时间线每个采样点
+# 从约 4KB 涨到约 180KB，缓存整段视频的时间线代价太大；需要与旧检测器逐帧一致时传 hist_width=None, bins=(180, 256)
+SCENE_STRIDE = 15
+SCENE_HIST_WIDTH = 320
+SCENE_HIST_BINS = (30, 32)
+SCENE_SEEK_MIN_STRIDE = 120
+
+
+def compute_scene_hist(frame, hist_width=None, bins=(180, 256)):
+    # 只取上方 80% 区域（避开底部字幕），可先缩小再算直方图
+    height = frame.shape[0]
+    cropped_frame = frame[0:int(height * 0.8), :]
+    if hist_width and cropped_frame.shape[1] > hist_width:
+        h = max(1, round(cropped_frame.shape[0] * hist_width / cropped_frame.shape[1]))
+        cropped_frame = cv2.resize(cropped_frame, (hist_width, h), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(cropped_frame, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, list(bins), [0, 180, 0, 256])
+    cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
+    return hist
+
+
+def iter_sampled_frames(cap, stride=SCENE_STRIDE, seek_min_stride=SCENE_SEEK_MIN_STRIDE, start=0, stop=None):
+    """
+    按步长产出 [start, stop) 范围内的 (frame_id, frame)：被跳过的帧只 grab() 不做颜色转换；
+    步长很大时直接 seek 到下一个采样点，由解码器从最近的关键帧开始解
+    """
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    use_seek = seek_min_stride and stride >= seek_min_stride and total > 0
+    frame_id = start
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+            # 容器不支持精确 seek 时从头 grab 到起点，保证与串行解码拿到的是同一帧
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            for _ in range(start):
+                if not cap.grab(): return
+    while True:
+        if not cap.grab(): break
+        ret, frame = cap.retrieve()
+        if not ret: break
+        yield frame_id, frame
+        frame_id += stride
+        if stop is not None and frame_id >= stop: break
+        if use_seek:
+            if frame_id >= total: break
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+            continue
+        for _ in range(stride - 1):
+            if not cap.grab(): return
+
+
+def detect_scenes_fast(video_path, threshold=30.0, stride=SCENE_STRIDE, hist_width=SCENE_HIST_WIDTH,
+                       bins=SCENE_HIST_BINS, seek_min_stride=SCENE_SEEK_MIN_STRIDE, min_gap=1.5,
+                       spill_dir=None):
+    """
+    快速切镜检测：返回 (KeyframeStore, stats)，stats 中包含处理帧率。
+    hist_width=None, bins=(180, 256), stride=15 时与旧检测器逐帧一致
+    """
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps == 0: fps = 30.0
+    store = KeyframeStore(video_path, fps, spill_dir=spill_dir)
+    prev_hist = None
+    last_id = -1
+    samples = 0
+    for frame_id, frame in iter_sampled_frames(cap, stride, seek_min_stride):
+        samples += 1
+        last_id = frame_id
+        hist = compute_scene_hist(frame, hist_width, bins)
+        if prev_hist is None:
+            store.add(frame_id, frame)
+            prev_hist = hist
+        else:
+            score = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
+            if (1 - score) > (threshold / 100.0) and (frame_id / fps - store.timestamps[-1] > min_gap):
+                store.add(frame_id, frame)
+                prev_hist = hist
+    processed = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or last_id + 1
+    cap.release()
+    elapsed = time.perf_counter() - start
+    add_span("scene.detect", elapsed, frames=processed, samples=samples)
+    stats = {
+        "frames": processed,
+        "samples": samples,
+        "seconds": elapsed,
+        "fps": processed / elapsed if elapsed > 0 else 0.0,
+    }
+    return store, stats
+
+
+def detect_scenes_ignore_subtitles(video_path, threshold=30.0, workers=1):
+    """
+    旧接口：全分辨率、全分箱直方图，返回完整帧列表（帧先落盘再一次性读出）。
+    workers != 1 时改走分段并行的两段式检测（workers=None 取 settings）
+    """
+    if workers == 1:
+        store, _ = detect_scenes_fast(video_path, threshold, stride=15, hist_width=None,
+                                      bins=(180, 256), seek_min_stride=0, spill_dir=tempfile.gettempdir())
+    else:
+        timeline = compute_scene_timeline(video_path, stride=15, hist_width=None, bins=(180, 256),
+                                          seek_min_stride=0, workers=workers)
+        store = KeyframeStore(video_path, timeline["fps"], spill_dir=tempfile.gettempdir())
+        for j in select_scene_cuts(timeline, threshold):
+            store.add(int(timeline["frame_ids"][j]))
+    return [store.frame(i) for i in range(len(store))], list(store.timestamps)
+
+
+def plan_segments(total, stride, workers, min_frames):
+    """
+    把 [0, total) 按步长对齐切成最多 workers 段，每段至少 min_frames 帧，返回 [(start, stop)]。
+    最后一段 stop 为 None，一直读到文件结尾（帧数元数据不准时也不会漏帧）
+    """
+    if total <= 0 or workers <= 1: return [(0, None)]
+    n = max(1, min(workers, total // max(1, min_frames)))
+    per = -(-total // n)
+    length = -(-per // stride) * stride
+    starts = [k * length for k in range(n) if k * length < total]
+    return [(s, s + length) for s in starts[:-1]] + [(starts[-1], None)]
+
+
+def scan_scene_histograms(video_path, stride, hist_width, bins, seek_min_stride, start=0, stop=None):
+    # 解码 [start, stop) 内的采样点，返回 (帧号列表, 原始直方图数组)；每段各开一个 capture，可在多个线程中同时执行
+    cap = cv2.VideoCapture(video_path)
+    frame_ids = []
+    hists = []
+    for frame_id, frame in iter_sampled_frames(cap, stride, seek_min_stride, start, stop):
+        frame_ids.append(frame_id)
+        hists.append(compute_scene_hist(frame, hist_width, bins).ravel())
+    cap.release()
+    return frame_ids, np.array(hists, dtype=np.float32).reshape(len(frame_ids), -1)
+
+
+def compute_scene_timeline(video_path, stride=SCENE_STRIDE, hist_width=SCENE_HIST_WIDTH,
+                           bins=SCENE_HIST_BINS, seek_min_stride=SCENE_SEEK_MIN_STRIDE, workers=None):
+    """
+    两段式检测的第一段：解码一次视频，记录每个采样点的帧号和直方图。
+    直方图存成去均值、单位化的向量，任意两点的 HISTCMP_CORREL 即为向量点积。
+    workers > 1 且视频足够长时分段多线程解码（workers=None 取 settings.scene_workers）：
+    OpenCV 解码与直方图计算期间释放 GIL，用线程即可吃满多核，也不必在 Streamlit 里另起进程。
+    返回纯 dict，便于 st.cache_data 序列化
+    """
+    if workers is None: workers = settings.scene_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps == 0: fps = 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    segments = plan_segments(total, stride, workers, settings.scene_segment_min_frames)
+    args = (video_path, stride, hist_width, bins, seek_min_stride)
+    if len(segments) > 1:
+        with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            parts = list(pool.map(lambda seg: scan_scene_histograms(*args, *seg), segments))
+    else:
+        parts = [scan_scene_histograms(*args)]
+    frame_ids = [frame_id for ids, _ in parts for frame_id in ids]
+    processed = total or (frame_ids[-1] + 1 if frame_ids else 0)
+    elapsed = time.perf_counter() - start
+    add_span("scene.decode", elapsed, frames=processed, samples=len(frame_ids), segments=len(segments))
+    hists = np.concatenate([hists for _, hists in parts]).reshape(len(frame_ids), -1)
+    return _build_timeline(fps, frame_ids, hists, processed, elapsed)
+
+
+def _normalize_hists(hists):
+    # 去均值、单位化，返回 (float32 向量, 纯色标记)；纯色画面的直方图方差为 0，compareHist 此时返回 1（视为相同）
+    vectors = hists.astype(np.float64)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.sqrt((vectors ** 2).sum(axis=1))
+    flat = norms <= 1e-12
+    vectors[~flat] /= norms[~flat, None]
+    vectors[flat] = 0
+    return vectors.astype(np.float32), flat
+
+
+def _build_timeline(fps, frame_ids, hists, processed, elapsed):
+    vectors, flat = _normalize_hists(hists)
+    return {
+        "fps": fps,
+        "frame_ids": np.array(frame_ids, dtype=np.int64),
+        "vectors": vectors,
+        "flat": flat,
+        "stats": {
+            "frames": processed,
+            "samples": len(frame_ids),
+            "seconds": elapsed,
+            "fps": processed / elapsed if elapsed > 0 else 0.0,
+        },
+    }
+
+
+def stream_scene_keyframes(video_path, threshold=30.0, stride=SCENE_STRIDE, hist_width=SCENE_HIST_WIDTH,
+                           bins=SCENE_HIST_BINS, seek_min_stride=SCENE_SEEK_MIN_STRIDE, min_gap=1.5,
+                           spill_dir=None, timeline=None, cancel=None):
+    """
+    边解码边切镜：与 compute_scene_timeline 相同的采样和直方图，按 select_scene_cuts 的规则在线判定切点。
+    返回 (KeyframeStore, 生成器)：每确认一个切点，生成器把关键帧加入仓库并产出 (下标, 全分辨率帧)，
+    下游可以立刻开始分析，不必等整段视频扫描完。
+    传入 timeline（dict）时，扫描完整结束后在其中填入与 compute_scene_timeline 相同的结果，便于放进缓存。
+    cancel 为 threading.Event：在其它线程中设置后，生成器在下一个采样点停止解码并结束（不填 timeline）
+    """
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps == 0: fps = 30.0
+    store = KeyframeStore(video_path, fps, spill_dir=spill_dir)
+    return store, _iter_scene_keyframes(cap, store, threshold, stride, hist_width, bins, seek_min_stride, min_gap,
+                                        timeline, cancel)
+
+
+def _iter_scene_keyframes(cap, store, threshold, stride, hist_width, bins, seek_min_stride, min_gap, timeline,
+                          cancel):
+    start = time.perf_counter()
+    paused = 0.0
+    limit = threshold / 100.0
+    frame_ids = []
+    hists = []
+    last = None
+    try:
+        for frame_id, frame in iter_sampled_frames(cap, stride, seek_min_stride):
+            # 每个采样点都检查取消标记，长镜头中间也能及时停下；没扫完的时间线不完整，不写入
+            if cancel is not None and cancel.is_set(): return
+            hist = compute_scene_hist(frame, hist_width, bins).ravel()
+            frame_ids.append(frame_id)
+            hists.append(hist)
+            vectors, flat = _normalize_hists(hist[None])
+            if last is not None:
+                score = 1.0 if flat[0] or last[1] else float(vectors[0] @ last[0])
+                if not ((1 - score) > limit and frame_id / store.fps - last[2] > min_gap): continue
+            last = (vectors[0], flat[0], frame_id / store.fps)
+            store.add(frame_id, frame)
+            # 下游处理（或队列已满时的等待）不计入解码耗时
+            t = time.perf_counter()
+            yield len(store) - 1, frame
+            paused += time.perf_counter() - t
+        processed = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or (frame_ids[-1] + 1 if frame_ids else 0)
+    finally:
+        cap.release()
+    elapsed = time.perf_counter() - start - paused
+    add_span("scene.decode", elapsed, frames=processed, samples=len(frame_ids), cuts=len(store))
+    if timeline is not None:
+        hists = np.array(hists, dtype=np.float32).reshape(len(frame_ids), -1)
+        timeline.update(_build_timeline(store.fps, frame_ids, hists, processed, elapsed))
+
+
+def _timeline_correl(timeline, idx, ref):
+    # 采样点 idx（数组）与采样点 ref 的直方图相关系数
+    vectors, flat = timeline["vectors"], timeline["flat"]
+    score = vectors[idx] @ vectors[ref]
+    return np.where(flat[idx] | flat[ref], 1.0, score)
+
+
+def scene_distance_curve(timeline):
+    # 相邻采样点的 1 - 相关系数，用于界面曲线展示
+    vectors, flat = timeline["vectors"], timeline["flat"]
+    if len(vectors) < 2: return np.zeros(0, dtype=np.float32)
+    score = np.einsum("ij,ij->i", vectors[1:], vectors[:-1])
+    return 1 - np.where(flat[1:] | flat[:-1], 1.0, score)
+
+
+def select_scene_cuts(timeline, threshold=30.0, min_gap=1.5, block=256):
+    """
+    两段式检测的第二段：在缓存的直方图上套用阈值与最小间隔规则，返回被选中的采样点下标。
+    与逐帧检测一致：每个候选都与“上一个被接受的关键帧”比较
+    """
+    n = len(timeline["frame_ids"])
+    if n == 0: return []
+    times = timeline["frame_ids"] / timeline["fps"]
+    limit = threshold / 100.0
+    cuts = [0]
+    lo = 1
+    while lo < n:
+        last = cuts[-1]
+        idx = np.arange(lo, min(n, lo + block))
+        hit = ((1 - _timeline_correl(timeline, idx, last)) > limit) & (times[idx] - times[last] > min_gap)
+        if hit.any():
+            j = int(idx[np.argmax(hit)])
+            cuts.append(j)
+            lo = j + 1
+        else:
+            lo = idx[-1] + 1
+    return cuts
+
+
+def keyframes_from_timeline(video_path, timeline, cuts, spill_dir=None):
+    # 只记录帧号，缩略图与全分辨率帧都在首次使用时回读
+    store = KeyframeStore(video_path, timeline["fps"], spill_dir=spill_dir)
+    for j in cuts:
+        store.add(int(timeline["frame_ids"][j]))
+    return store
@@ -0,0 +1,138 @@
+"""
+轻量追踪：每次运行一个 Trace，按阶段 / 按 API 请求记录 span（耗时、发送字节、token、重试次数）。
+当前 Trace 存在 ContextVar 中，线程池任务用 bind() 包装后继承提交方的 Trace；没有活动 Trace 时 span 不做任何记录。
+指标日志的汇总见 metrics.py
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from .config import settings
+
+_current = contextvars.ContextVar("video_analysis_trace", default=None)
+
+
+class Trace:
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._t1 = None
+        self.spans = []
+        self.lock = threading.Lock()
+        self.finished = False
+
+    def add(self, name, seconds, start=None, **attrs):
+        if start is None: start = time.perf_counter() - seconds
+        span = {"name": name, "start": round(start - self._t0, 6), "seconds": round(seconds, 6), **attrs}
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    def extend(self, spans, offset=0.0):
+        # 合并其他进程里记录的 span（命令行的检测进程）
+        with self.lock:
+            self.spans.extend(dict(s, start=round(s["start"] + offset, 6)) for s in spans)
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    @property
+    def elapsed(self):
+        return (self._t1 or time.perf_counter()) - self._t0
+
+    def summary(self):
+        """
+        按 span 名称汇总：次数、总耗时、p50 / p95 / 最大耗时，以及各数值属性之和
+        """
+        groups = {}
+        with self.lock:
+            for span in self.spans:
+                groups.setdefault(span["name"], []).append(span)
+        rows = []
+        for name, spans in groups.items():
+            seconds = np.array([s["seconds"] for s in spans])
+            row = {"span": name, "count": len(spans), "seconds": round(float(seconds.sum()), 4),
+                   "p50": round(float(np.percentile(seconds, 50)), 4),
+                   "p95": round(float(np.percentile(seconds, 95)), 4), "max": round(float(seconds.max()), 4)}
+            for span in spans:
+                for key, value in span.items():
+                    if key in ("name", "start", "seconds") or isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    row[key] = row.get(key, 0) + value
+            rows.append(row)
+        return sorted(rows, key=lambda r: -r["seconds"])
+
+    def to_dict(self):
+        with self.lock:
+            spans = list(self.spans)
+        return {"name": self.name, "run_id": self.run_id, "started": self.started, "seconds": round(self.elapsed, 4),
+                "attrs": self.attrs, "summary": self.summary(), "spans": spans}
+
+    def finish(self, path=None):
+        """
+        结束本次运行：配置了 metrics_log 时把每个 span 作为一行 JSON 追加到日志文件
+        """
+        if self.finished: return
+        self.finished = True
+        self._t1 = time.perf_counter()
+        path = settings.metrics_log if path is None else path
+        if not path: return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        base = {"ts": round(self.started, 3), "run": self.run_id, "trace": self.name, **self.attrs}
+        lines = [json.dumps({**base, "span": "total", "seconds": round(self.elapsed, 6)}, ensure_ascii=False)]
+        with self.lock:
+            lines += [json.dumps({**base, **{k: v for k, v in s.items() if k != "name"}, "span": s["name"]},
+                                 ensure_ascii=False) for s in self.spans]
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    记录一个阶段的耗时；yield 出的 dict 可以在阶段内继续补充属性（字节数、token 等）
+    """
+    trace = _current.get()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        if trace is not None:
+            trace.add(name, time.perf_counter() - start, start, **attrs)
+
+
+def add_span(name, seconds, **attrs):
+    trace = _current.get()
+    if trace is not None: trace.add(name, seconds, **attrs)
+
+
+def bind(fn):
+    # 让线程池中的任务记录到提交方的 Trace
+    trace = _current.get()
+    if trace is None: return fn
+    def run(*args, **kwargs):
+        token = _current.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
@@ -0,0 +1,95 @@
+"""
+上传文件落盘仓库
+"""
+import functools
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from .config import settings
+from .frames import remove_file
+from .tracing import span
+
+
+class UploadStore:
+    """
+    上传文件落盘仓库：分块拷贝并同时计算 sha256，文件以哈希命名，同内容只保留一份；
+    超过保留时间的文件（含中断残留的 .part）直接删除，总大小超限时按最近使用时间淘汰。
+    grace 秒内用过的文件其他会话可能还在回读关键帧，不做大小淘汰（此时允许暂时超出上限）
+    """
+    def __init__(self, root, max_bytes=4096 * 1024 * 1024, max_age=24 * 3600, grace=30 * 60, chunk_size=1 << 20):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.grace = grace
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def spool(self, uploaded):
+        # 返回 (落盘路径, 内容哈希)
+        ext = os.path.splitext(getattr(uploaded, "name", ""))[1].lower()
+        fd, part_path = tempfile.mkstemp(suffix=".part", dir=self.root)
+        h = hashlib.sha256()
+        try:
+            uploaded.seek(0)
+            with span("upload.spool") as stats, os.fdopen(fd, "wb") as out:
+                stats["bytes"] = 0
+                for chunk in iter(lambda: uploaded.read(self.chunk_size), b""):
+                    h.update(chunk)
+                    out.write(chunk)
+                    stats["bytes"] += len(chunk)
+            file_hash = h.hexdigest()
+            path = os.path.join(self.root, file_hash + ext)
+            with self.lock:
+                if os.path.exists(path):
+                    os.remove(part_path)
+                    os.utime(path)
+                else:
+                    os.replace(part_path, path)
+                self.evict(keep=path)
+        except BaseException:
+            remove_file(part_path)
+            raise
+        finally:
+            uploaded.seek(0)
+        return path, file_hash
+
+    def evict(self, keep=None):
+        now = time.time()
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                st_ = os.stat(path)
+            except OSError:
+                continue
+            if path != keep and now - st_.st_mtime > self.max_age:
+                remove_file(path)
+                continue
+            total += st_.st_size
+            # 正在写入的 .part 只按保留时间清理；最近用过的文件不参与大小淘汰
+            if path != keep and not name.endswith(".part") and now - st_.st_mtime > self.grace:
+                entries.append((st_.st_mtime, st_.st_size, path))
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            remove_file(path)
+            total -= size
+
+
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _upload_store(root, max_bytes, max_age, grace):
+    return UploadStore(root, max_bytes, max_age, grace)
+
+
+
+def get_upload_store():
+    with _lock:
+        return _upload_store(settings.upload_dir, int(settings.upload_max_mb * 1024 * 1024),
+                             settings.upload_max_age_hours * 3600, settings.upload_grace_minutes * 60)
@@ -0,0 +1,326 @@
+"""
+视觉分析：图生文反推、视频帧拆解（单帧 / 批量）与 OCR
+"""
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .api import parse_json_content, vision_cache_key, vision_chat
+from .cache import get_result_cache
+from .config import settings
+from .dedup import RepeatPlanner, frame_phash, is_reusable, mark_repeat
+from .encoding import get_image_base64
+from .tracing import add_span, bind
+
+logger = logging.getLogger("video_analysis")
+
+
+def analyze_image_reverse_engineering(image_base64, on_text=None):
+    """
+    图生文反推模式：升级版 System Prompt，追求 95% 还原度。
+    传入 on_text 时流式请求，生成过程中以目前为止的原始文本回调
+    """
+    # === 核心修改：赋予 AI 专家人设，要求极度精准的关键词 ===
+    system_prompt = """
+    你是一位顶级的 AI 绘画提示词工程师（Prompt Engineer），精通 Midjourney、Stable Diffusion 和 Flux 的提示词逻辑。
+    请深度剖析这张图片，反推出能完美还原该画面的提示词。
+    
+    请严格按照以下 JSON 格式输出（不要 Markdown）：
+    {
+        "style": "这里列出核心艺术风格。例如：Cyberpunk, Ukiyo-e, Oil Painting, 3D Render (Octane), Pixar Style, Matte Painting...",
+        "shot": "这里列出镜头与光影。例如：Wide angle, Telephoto lens, Dutch angle, Volumetric lighting, Rim light, Bokeh...",
+        "prompt": "这里编写一段高质量的英文 Prompt。必须包含：
+                   1. 主体细节（五官、衣着材质、表情）。
+                   2. 环境细节（背景元素、天气）。
+                   3. 技术参数（如：8k, photorealistic, masterpiece, highly detailed, unreal engine 5）。
+                   请使用逗号分隔的关键词形式。"
+    }
+    """
+    
+    try:
+        return vision_chat(system_prompt, image_base64, max_tokens=800, parse=parse_json_content, on_text=on_text)
+    except Exception as e:
+        return {"style": "Error", "shot": "Error", "prompt": str(e)}
+
+
+# === 这里是核心修改：大幅增强了提示词的要求 ===
+FRAME_RECONSTRUCTION_PROMPT = """
+    你是一个顶级的 AI 艺术导演和提示词专家。
+    请深度分析这张视频截图，目标是生成一段能让 Midjourney/Sora 完美还原画面神韵的英文 Prompt。
+    
+    请特别注意以下细节的提取：
+    1. **人物身份与特征**：不要只说 "Person"。请仔细观察衣着（如长袍、斗笠、破旧衣物），判断是否为 Monk (僧人), Daoist (道士), Wanderer (流浪者) 或 Elder (老者)。
+    2. **摄影与艺术风格**：这是写实照片、CG渲染还是黑白电影？如果是黑白的，请加上 "Black and white photography, vintage style, film grain" 等关键词。
+    3. **环境与氛围**：描述天气（阴沉、迷雾）、光影（柔光、逆光）及画面的情绪（孤独、史诗感）。
+    
+    请严格按照 JSON 格式输出：
+    {
+        "cn_desc": "中文深度画面描述（必须明确写出人物身份，如：背负行囊的苦行僧/老道士，以及画面的黑白复古质感）",
+        "en_prompt": "High-fidelity English text-to-image prompt. Include keywords for: Subject Identity (e.g., old monk, ascetic), Clothing (traditional robes), Art Style (e.g., 1920s vintage photography, black and white, grainy film), Lighting, and Atmosphere."
+    }
+    不要输出 Markdown 标记。
+    """
+
+
+# 单帧输出预算；批量请求每帧给同样的预算，单个请求总预算有上限，超出的帧数拆成多个请求
+FRAME_MAX_TOKENS = 800
+FRAME_BATCH_MAX_TOKENS = 4096
+FRAME_BATCH_MAX_FRAMES = FRAME_BATCH_MAX_TOKENS // FRAME_MAX_TOKENS
+
+# 批量模式：把多张截图放进同一个请求，要求按帧编号返回 JSON 数组
+FRAME_BATCH_PROMPT = FRAME_RECONSTRUCTION_PROMPT + """
+    本次请求按顺序给出 {count} 张视频截图，每张前面标有“帧 i”（i 从 0 开始）。
+    请对每一帧分别按上面的要求分析，并只输出一个 JSON 数组，每个元素形如：
+    {"index": i, "cn_desc": "...", "en_prompt": "..."}
+    数组需包含全部 {count} 帧，不要输出 Markdown 标记。
+    """
+
+
+def analyze_video_frame_reconstruction(image_base64):
+    """
+    针对 90% 还原度的画面帧反推 Prompt (升级版：增强风格与身份识别)
+    """
+    try:
+        # 稍微增加了 token 限制以允许更详细的描述
+        return vision_chat(FRAME_RECONSTRUCTION_PROMPT, image_base64, max_tokens=FRAME_MAX_TOKENS,
+                           parse=parse_json_content)
+    except Exception as e:
+        return {"cn_desc": "解析失败", "en_prompt": str(e)}
+
+
+def _parse_frame_batch(content):
+    # 解析批量结果，返回 {index: {"cn_desc", "en_prompt"}}；格式不对的条目直接丢弃
+    data = parse_json_content(content)
+    if isinstance(data, dict):
+        data = data.get("frames") or data.get("results") or []
+    parsed = {}
+    for item in data if isinstance(data, list) else []:
+        if not isinstance(item, dict): continue
+        try:
+            index = int(item.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if isinstance(item.get("cn_desc"), str) and isinstance(item.get("en_prompt"), str):
+            parsed[str(index)] = {"cn_desc": item["cn_desc"], "en_prompt": item["en_prompt"]}
+    return parsed
+
+
+def analyze_video_frames_batch(image_base64_list):
+    """
+    一次请求分析多张关键帧，返回与输入等长的结果列表。
+    已缓存的单帧结果直接复用；超过 FRAME_BATCH_MAX_FRAMES 帧时拆成多个请求，保证每帧的输出预算不低于单帧请求，
+    不会因为截断而整批解析失败；批量返回里缺失或格式错误的帧自动退回单帧请求
+    """
+    cache = get_result_cache()
+    results = [cache.get(vision_cache_key(FRAME_RECONSTRUCTION_PROMPT, b64, FRAME_MAX_TOKENS))
+               for b64 in image_base64_list]
+    todo = [i for i, res in enumerate(results) if res is None]
+    for k in range(0, len(todo), FRAME_BATCH_MAX_FRAMES):
+        group = todo[k:k + FRAME_BATCH_MAX_FRAMES]
+        # 只剩一帧时直接走下面的单帧请求
+        if len(group) < 2: continue
+        images = [image_base64_list[i] for i in group]
+        try:
+            parsed = vision_chat(FRAME_BATCH_PROMPT.replace("{count}", str(len(images))), images,
+                                 max_tokens=FRAME_MAX_TOKENS * len(images), parse=_parse_frame_batch)
+        except Exception as e:
+            logger.warning("批量视觉请求失败，退回单帧请求: %s", e)
+            parsed = {}
+        for k, i in enumerate(group):
+            if str(k) in parsed:
+                results[i] = parsed[str(k)]
+                # 写回单帧缓存，之后换一种分组方式也能命中
+                cache.set(vision_cache_key(FRAME_RECONSTRUCTION_PROMPT, image_base64_list[i], FRAME_MAX_TOKENS),
+                          results[i])
+    for i, res in enumerate(results):
+        if res is None:
+            results[i] = analyze_video_frame_reconstruction(image_base64_list[i])
+    return results
+
+
+def analyze_ocr_text(image_base64):
+    system_prompt = "你是一个专业的 OCR 文字识别助手。请识别画面中出现的所有【固定中文文字】，忽略底部的即时字幕。直接输出内容。"
+    try:
+        return vision_chat(system_prompt, image_base64, max_tokens=500)
+    except Exception as e:
+        return f"OCR Error: {str(e)}"
+
+
+def frame_batch_size(batch_size=None):
+    # 实际每个请求打包的关键帧数：batch_size 缺省取 settings，且不超过单请求 token 预算允许的帧数
+    if batch_size is None: batch_size = settings.vision_batch_size
+    return max(1, min(batch_size, FRAME_BATCH_MAX_FRAMES))
+
+
+def _analyze_images(images):
+    if len(images) == 1: return [analyze_video_frame_reconstruction(images[0])]
+    return analyze_video_frames_batch(images)
+
+
+def _analyze_frames(frames):
+    # 回读失败（返回 None，如视频已被删除或截断）的帧记为解析失败，不影响同批其它帧，也不中断整个生成器
+    results = [{"cn_desc": "解析失败", "en_prompt": "帧读取失败"} for _ in frames]
+    todo = [k for k, frame in enumerate(frames) if frame is not None]
+    if todo:
+        for k, res in zip(todo, _analyze_images([get_image_base64(frames[k]) for k in todo])):
+            results[k] = res
+    return results
+
+
+def iter_keyframe_analyses(keyframes, batch_size=None, max_workers=None, shot_index=None, video_key=None,
+                           source=None):
+    """
+    关键帧已全部检测出来时按时间顺序产出 (下标, 结果)，与边检测边分析共用同一条流水线：
+    后台线程依次回读关键帧，同一帧既用来算 pHash 又用来编码请求，每帧只回读一次，读到第一帧就开始请求。
+    传入 shot_index 时与本视频或索引中已分析镜头重复的帧不调用 API，直接复用结果并带上 repeat_of 标记；
+    新分析的结果写回索引
+    """
+    stream = ((i, keyframes.frame(i)) for i in range(len(keyframes)))
+    return iter_streamed_analyses(keyframes, stream, batch_size, max_workers, shot_index=shot_index,
+                                  video_key=video_key, source=source)
+
+
+# 边检测边分析时后台线程检查停止标记的间隔（秒）
+STREAM_POLL_SECONDS = 0.1
+
+
+def iter_streamed_analyses(keyframes, stream, batch_size=None, max_workers=None, queue_size=None, shot_index=None,
+                           video_key=None, source=None, cancel=None, on_progress=None):
+    """
+    边检测边分析：stream 为产出 (下标, 全分辨率帧) 的生成器（stream_scene_keyframes 返回的生成器，
+    或 iter_keyframe_analyses 中依次回读仓库的生成器），在后台线程中解码并产出新关键帧，
+    经有界队列（满了暂停解码）交给分发线程做重复判定、按批提交请求；本生成器按时间顺序产出 (下标, 结果)。
+    除第一批（首个结果尽快返回）外，批次凑满 batch_size 或解码结束才提交，与一次性分组时的请求数相同。
+    cancel 应与传给 stream_scene_keyframes 的是同一个 Event：本生成器结束或被提前关闭（如 Streamlit 重跑）时设置它，
+    不再提交新请求，解码在下一个采样点停下并释放 capture；不传时只能等到下一个切点才停。
+    on_progress(已检测镜头数) 在等待结果期间、检测到新镜头时于本生成器所在线程回调，用于刷新界面进度
+    """
+    batch_size = frame_batch_size(batch_size)
+    if max_workers is None: max_workers = settings.vision_max_in_flight
+    if queue_size is None: queue_size = settings.keyframe_queue_size
+    video_key = video_key or keyframes.video_path
+    source = source or os.path.basename(keyframes.video_path)
+    planner = RepeatPlanner(shot_index, video_key)
+    frames = queue.Queue(maxsize=max(1, queue_size))
+    planned = queue.Queue()
+    stop = cancel if cancel is not None else threading.Event()
+    errors = []
+    hashes = {}
+    # 在途请求持有全分辨率帧，名额有上限；分析跟不上时队列积满，解码随之暂停
+    slots = threading.BoundedSemaphore(max(1, max_workers) * 2)
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    analyze = bind(lambda batch: _analyze_frames([frame for _, frame in batch]))
+
+    def put(item):
+        # 队列满时等待，但每隔一会儿检查是否已停止，不会永远卡在 put 上
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=STREAM_POLL_SECONDS)
+                return
+            except queue.Full:
+                pass
+
+    def produce():
+        try:
+            for i, frame in stream:
+                if stop.is_set(): break
+                put((i, frame, frame_phash(frame) if planner.active and frame is not None else None))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stream.close()
+            put(None)
+
+    def dispatch():
+        batch = []
+        held = []
+        started = False
+        def flush():
+            # 提交手头的批次，连同排在它后面的重复镜头按原顺序交给消费端
+            nonlocal started
+            if not batch: return
+            while not slots.acquire(timeout=STREAM_POLL_SECONDS):
+                if stop.is_set(): return
+            if stop.is_set():
+                slots.release()
+                return
+            fut = pool.submit(analyze, list(batch))
+            fut.add_done_callback(lambda _: slots.release())
+            started = True
+            for i, kind, payload in held:
+                planned.put((i, kind, (fut, payload) if kind == "batch" else payload))
+            batch.clear()
+            held.clear()
+        try:
+            while not stop.is_set():
+                try:
+                    item = frames.get(timeout=STREAM_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+                if item is None: break
+                i, frame, key = item
+                hashes[i] = key
+                plan = planner.plan(key, keyframes.frame_ids[i])
+                if plan is None:
+                    held.append((i, "batch", len(batch)))
+                    batch.append((i, frame))
+                    # 第一批不等凑满，首个结果尽快返回；之后凑满 batch_size 再提交
+                    if len(batch) >= batch_size or not started: flush()
+                elif batch:
+                    # 重复镜头不占请求，排在未提交的批次之后，不打断批次
+                    held.append((i,) + plan)
+                else:
+                    planned.put((i,) + plan)
+            flush()
+        except Exception as e:
+            # 出错后由消费端抛出并设置 stop，解码线程随之退出
+            errors.append(e)
+        finally:
+            planned.put(None)
+
+    threads = [threading.Thread(target=bind(produce), daemon=True), threading.Thread(target=bind(dispatch), daemon=True)]
+    for t in threads: t.start()
+    detected = 0
+    def wait(get):
+        # 每个轮询周期醒来一次，检测进度有变化就回调 on_progress（Streamlit 只能在脚本线程里更新界面）
+        nonlocal detected
+        while True:
+            if on_progress is not None and len(keyframes) != detected:
+                detected = len(keyframes)
+                on_progress(detected)
+            try:
+                return get(timeout=STREAM_POLL_SECONDS)
+            except (queue.Empty, TimeoutError):
+                pass
+
+    results = {}
+    try:
+        for i, kind, payload in iter(lambda: wait(planned.get), None):
+            if kind == "batch":
+                fut, pos = payload
+                res = wait(fut.result)[pos]
+                if shot_index is not None and hashes[i] is not None and is_reusable(res):
+                    shot_index.add(hashes[i], {"result": res, "video": video_key, "source": source,
+                                               "frame_id": keyframes.frame_ids[i], "time": keyframes.timestamps[i]})
+            elif kind == "video":
+                j = payload
+                if is_reusable(results[j]):
+                    add_span("dedup.reuse", 0.0)
+                    res = mark_repeat(results[j], source, keyframes.timestamps[j])
+                else:
+                    # 被复用的镜头分析失败时单独再分析一次
+                    res = _analyze_frames([keyframes.frame(i)])[0]
+            else:
+                if not payload["self"]: add_span("dedup.reuse", 0.0)
+                res = payload["result"] if payload["self"] else mark_repeat(payload["result"], payload["source"],
+                                                                            payload["time"])
+            results[i] = res
+            yield i, res
+        if errors: raise errors[0]
+    finally:
+        stop.set()
+        # 先等分发线程退出（最多一个轮询周期），之后不会再有请求提交到已关闭的线程池
+        threads[1].join()
+        pool.shutdown(wait=False, cancel_futures=True)